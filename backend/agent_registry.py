@@ -0,0 +1,88 @@
+import os
+from typing import Callable
+
+from google.adk import Runner
+from google.adk.agents import Agent
+
+from manim_utils import Timer, load_prompt_template
+from session_manager import session_manager
+
+
+class AgentRegistry:
+    """
+    Builds the agent graph and its runners once and shares them between requests.
+
+    The prompt templates are watched through their modification times: when
+    one of them changes on disk, the agents are rebuilt on the next request,
+    so prompts can be edited without restarting the server.
+
+    Args:
+        app_name: str - The app the runners' sessions belong to.
+        template_paths: dict[str, str] - The prompt template of each agent.
+        build_agents: Callable - Builds the agents from their loaded templates,
+            both by agent name.
+    """
+
+    def __init__(
+        self,
+        app_name: str,
+        template_paths: dict[str, str],
+        build_agents: Callable[[dict[str, str]], dict[str, Agent]],
+    ):
+        self.app_name = app_name
+        self.template_paths = template_paths
+        self.build_agents = build_agents
+        self._runners: dict[str, Runner] = {}
+        self._mtimes: dict[str, int] = {}
+
+    def _template_mtimes(self) -> dict[str, int]:
+        return {
+            name: os.stat(path).st_mtime_ns
+            for name, path in self.template_paths.items()
+        }
+
+    def load(self) -> None:
+        """(Re)loads the prompt templates and rebuilds the agents and runners."""
+        with Timer("Initialize Agents"):
+            # Read the mtimes first so an edit made while loading triggers a reload
+            mtimes = self._template_mtimes()
+            templates = {
+                name: load_prompt_template(path)
+                for name, path in self.template_paths.items()
+            }
+
+            agents = self.build_agents(templates)
+            self._runners = {
+                name: Runner(
+                    app_name=self.app_name,
+                    session_service=session_manager.service,
+                    agent=agent,
+                )
+                for name, agent in agents.items()
+            }
+            self._mtimes = mtimes
+
+    def get_runner(self, agent_name: str) -> Runner:
+        """
+        Returns the shared runner of an agent, rebuilding the agents first if a
+        template changed.
+        """
+        if not self._runners:
+            self.load()
+            return self._runners[agent_name]
+
+        try:
+            changed = self._template_mtimes() != self._mtimes
+        except OSError as e:
+            # A template is being replaced, keep serving the current agents
+            print(f"Failed to check prompt templates, keeping current agents: {e}")
+            return self._runners[agent_name]
+
+        if changed:
+            print("Prompt templates changed, reloading agents")
+            try:
+                self.load()
+            except OSError as e:
+                print(f"Failed to reload prompt templates: {e}")
+
+        return self._runners[agent_name]
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the chat routing modes: "direct" (endpoints run their specialist
+agent) against "coordinator" (every request goes through service_chat_agent).
+
+Runs the same /links and /chat workloads in both modes and reports latency,
+model calls and tokens. Needs GOOGLE_API_KEY, run it from the backend folder:
+
+    python chat_service/bench_routing.py --runs 5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+from time import perf_counter
+
+import dotenv
+from google.adk.plugins import BasePlugin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_cache  # noqa: E402
+import service_chat  # noqa: E402
+
+dotenv.load_dotenv()
+
+LINKS_CONTEXT = "I need help solving quadratic equations like x^2 + 5x + 6 = 0."
+CHAT_HISTORY = [
+    {
+        "role": "user",
+        "content": (
+            "I'm stuck on factoring x^2 + 5x + 6 = 0. "
+            "Can you help me understand the first step?"
+        ),
+    }
+]
+
+
+class UsagePlugin(BasePlugin):
+    """Counts model calls and tokens of every agent, including AgentTool runs."""
+
+    def __init__(self):
+        super().__init__(name="usage")
+        self.reset()
+
+    def reset(self):
+        self.model_calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        usage = llm_response.usage_metadata
+        if usage is None or llm_response.partial:
+            return None
+        self.model_calls += 1
+        self.prompt_tokens += usage.prompt_token_count or 0
+        self.output_tokens += usage.candidates_token_count or 0
+        return None
+
+
+async def measure(name, workload, usage, runs):
+    latencies, calls, prompt_tokens, output_tokens = [], [], [], []
+
+    for _ in range(runs):
+        usage.reset()
+        start = perf_counter()
+        await workload()
+        latencies.append(perf_counter() - start)
+        calls.append(usage.model_calls)
+        prompt_tokens.append(usage.prompt_tokens)
+        output_tokens.append(usage.output_tokens)
+
+    return {
+        "name": name,
+        "p50": statistics.median(latencies),
+        "max": max(latencies),
+        "calls": statistics.mean(calls),
+        "prompt_tokens": statistics.mean(prompt_tokens),
+        "output_tokens": statistics.mean(output_tokens),
+    }
+
+
+async def main(runs):
+    # Cached responses would make every run after the first one free
+    llm_cache.LLM_CACHE_TTL_SECONDS = 0
+
+    usage = UsagePlugin()
+    service_chat.runners = service_chat.build_runners(plugins=[usage])
+
+    workloads = {
+        "links": lambda: service_chat.get_links(b"", LINKS_CONTEXT),
+        "chat": lambda: service_chat.converse(CHAT_HISTORY),
+    }
+
+    results = []
+    for mode in ("coordinator", "direct"):
+        service_chat.CHAT_ROUTING_MODE = mode
+        for name, workload in workloads.items():
+            print(f"Running {name} in {mode} mode ({runs} runs)...")
+            result = await measure(name, workload, usage, runs)
+            results.append({"mode": mode, **result})
+
+    print()
+    print(
+        f"{'mode':<12} {'endpoint':<8} {'p50 (s)':>8} {'max (s)':>8} {'calls':>6} "
+        f"{'prompt tok':>11} {'output tok':>11}"
+    )
+    for r in results:
+        print(
+            f"{r['mode']:<12} {r['name']:<8} {r['p50']:>8.2f} {r['max']:>8.2f} "
+            f"{r['calls']:>6.1f} {r['prompt_tokens']:>11.0f} "
+            f"{r['output_tokens']:>11.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--runs", type=int, default=5, help="Requests per endpoint and mode"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(main(args.runs))
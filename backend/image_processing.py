@@ -0,0 +1,130 @@
+import asyncio
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from google.genai.types import Blob, Part
+from PIL import Image, ImageOps
+
+from upload_store import upload_id_of
+
+# Longest edge of the images sent to the models, larger ones are downscaled
+# (0 keeps the original size)
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1536"))
+
+# Quality of the images re-encoded as JPEG
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+
+# Formats typical of screenshots and diagrams, kept lossless so text stays
+# sharp; everything else (photos) is re-encoded as JPEG
+LOSSLESS_FORMATS = {"PNG", "GIF", "BMP", "TIFF"}
+
+# Normalized images kept in memory, the same image often feeds several
+# requests at once (links, chat and video)
+NORMALIZED_CACHE_SIZE = 16
+
+# Normalized images by upload id, only the (small) normalized bytes are kept
+_normalized: OrderedDict[str, tuple[bytes, str]] = OrderedDict()
+_normalized_lock = threading.Lock()
+
+
+def sniff_mime_type(image_data: bytes) -> str:
+    """Guesses the type of an image from its header bytes, PNG if unknown."""
+    if image_data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if image_data.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if image_data.startswith(b"RIFF") and b"WEBP" in image_data[:12]:
+        return "image/webp"
+    return "image/png"
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """Converts an image to RGB, drawing transparent areas on white."""
+    if image.mode == "P":
+        image = image.convert("RGBA")
+    if image.mode in ("RGBA", "LA"):
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def normalize_image(image_data: bytes) -> tuple[bytes, str]:
+    """
+    Prepares an image for a multimodal request: applies its EXIF orientation,
+    strips its metadata, downscales it to `IMAGE_MAX_EDGE` and re-encodes it,
+    as PNG for screenshot formats and as JPEG otherwise.
+
+    Args:
+        image_data: bytes - The image as uploaded.
+
+    Returns:
+        tuple[bytes, str] - The image to send and its mime type. Data Pillow
+            cannot read is returned unchanged, with the type sniffed from it.
+    """
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            source_format = image.format
+            if IMAGE_MAX_EDGE > 0:
+                # Lets JPEG decode at a reduced scale instead of full size
+                image.draft("RGB", (IMAGE_MAX_EDGE, IMAGE_MAX_EDGE))
+            image = ImageOps.exif_transpose(image)
+            if IMAGE_MAX_EDGE > 0:
+                image.thumbnail(
+                    (IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), Image.Resampling.LANCZOS
+                )
+            # Drop EXIF, ICC profiles, text chunks...
+            image.info = {}
+
+            output = io.BytesIO()
+            if source_format in LOSSLESS_FORMATS:
+                if image.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+                    image = image.convert("RGBA")
+                image.save(output, format="PNG", optimize=True)
+                mime_type = "image/png"
+            else:
+                _flatten(image).save(
+                    output, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True
+                )
+                mime_type = "image/jpeg"
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f"Sending the image as is, it could not be normalized: {e}")
+        return image_data, sniff_mime_type(image_data)
+
+    return output.getvalue(), mime_type
+
+
+def _normalize_cached(image_data: bytes) -> tuple[bytes, str]:
+    """`normalize_image` memoized by the upload id of the image."""
+    key = upload_id_of(image_data)
+    with _normalized_lock:
+        if key in _normalized:
+            _normalized.move_to_end(key)
+            return _normalized[key]
+
+    normalized = normalize_image(image_data)
+    if normalized[0] is image_data:
+        return normalized  # not an image Pillow reads, do not keep the original
+
+    with _normalized_lock:
+        _normalized[key] = normalized
+        while len(_normalized) > NORMALIZED_CACHE_SIZE:
+            _normalized.popitem(last=False)
+    return normalized
+
+
+async def image_to_part(image_data: bytes) -> Part:
+    """
+    Normalizes an image in a worker thread and wraps it for a model request.
+
+    Args:
+        image_data: bytes - The image as uploaded.
+
+    Returns:
+        Part - The part holding the normalized image.
+    """
+    data, mime_type = await asyncio.to_thread(_normalize_cached, image_data)
+    print(f"Normalized image from {len(image_data)} to {len(data)} bytes ({mime_type})")
+    return Part(inline_data=Blob(data=data, mime_type=mime_type))
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+from manim_utils import atomic_write, prune_directory_lru, touch
+
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "./cache/llm/")
+
+# How long a model response is reused for identical requests (0 disables)
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+
+# Upper bound for the responses kept in the cache
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024**2)))
+
+# Where the key of a request waits for its response, temp: state is not persisted
+_KEY_STATE = "temp:llm_cache_key"
+
+# Request fields that differ between identical requests (ADK generated ids)
+_VOLATILE_FIELDS = {"id", "thought_signature"}
+
+os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: _canonical(item)
+            for key, item in value.items()
+            if key not in _VOLATILE_FIELDS
+        }
+    if isinstance(value, list):
+        return [_canonical(item) for item in value]
+    return value
+
+
+def request_key(llm_request: LlmRequest) -> str | None:
+    """
+    Computes the cache key of a model request: a hash of the model name, the
+    contents (text and image bytes alike) and the generation config, which
+    holds the agent's instruction and tools.
+
+    Returns:
+        str | None - The hex digest of the request, or None if it cannot be
+            serialized (it is then never cached).
+    """
+    try:
+        request = llm_request.model_dump(
+            mode="json", include={"model", "contents", "config"}, exclude_none=True
+        )
+        payload = json.dumps(_canonical(request), sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(LLM_CACHE_DIR, f"{key}.json")
+
+
+def lookup(key: str) -> LlmResponse | None:
+    """Returns the cached response of a request, or None on a miss."""
+    path = _cache_path(key)
+
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            entry = json.load(file)
+        if time.time() - entry["created_at"] > LLM_CACHE_TTL_SECONDS:
+            os.remove(path)
+            return None
+        touch(path)
+        return LlmResponse.model_validate(entry["response"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def store(key: str, llm_response: LlmResponse) -> None:
+    """
+    Adds a response to the cache and evicts the least recently used responses
+    if the cache grew past `LLM_CACHE_MAX_BYTES`.
+    """
+    entry = {
+        "created_at": time.time(),
+        "response": llm_response.model_dump(mode="json", exclude_none=True),
+    }
+
+    with atomic_write(_cache_path(key)) as temp_path:
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(entry, file)
+
+    evicted = prune_directory_lru(LLM_CACHE_DIR, LLM_CACHE_MAX_BYTES)
+    if evicted:
+        print(f"Evicted {evicted} responses from the LLM cache")
+
+
+def invalidate(key: str) -> None:
+    try:
+        os.remove(_cache_path(key))
+    except FileNotFoundError:
+        pass
+
+
+def _cacheable(llm_response: LlmResponse) -> bool:
+    return (
+        not llm_response.partial
+        and llm_response.error_code is None
+        and llm_response.content is not None
+        and bool(llm_response.content.parts)
+    )
+
+
+async def before_model_callback(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> LlmResponse | None:
+    """
+    Answers a model request from the cache, skipping the model call (and the
+    agent's after model callbacks) on a hit. Use together with
+    `after_model_callback`, which stores the response on a miss.
+    """
+    if LLM_CACHE_TTL_SECONDS <= 0:
+        return None
+
+    key = request_key(llm_request)
+    callback_context.state[_KEY_STATE] = key
+    if key is None:
+        return None
+
+    llm_response = await asyncio.to_thread(lookup, key)
+    if llm_response is not None:
+        print(f"{callback_context.agent_name} answered from the LLM cache")
+    return llm_response
+
+
+async def after_model_callback(
+    callback_context: CallbackContext, llm_response: LlmResponse
+) -> None:
+    """Stores the complete response of a request that missed the cache."""
+    key = callback_context.state.get(_KEY_STATE)
+    if key is None or not _cacheable(llm_response):
+        return None
+
+    callback_context.state[_KEY_STATE] = None
+    try:
+        await asyncio.to_thread(store, key, llm_response)
+    except OSError as e:
+        print(f"Failed to cache the response of {callback_context.agent_name}: {e}")
+    return None
+
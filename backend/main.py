@@ -1,13 +1,30 @@
 import uvicorn
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from typing import List, Dict, Any, Optional
-import base64
+import asyncio
 import io
 import json
-
-from service_chat import converse, get_links
+import os
+
+from manim_agents import agent_registry
+from manim_errors import render_metrics
+from manim_gen import RENDER_BACKEND, RenderJob, fetch_video, find_render_job
+from manim_jobs import JobStatus, job_manager
+from manim_pool import render_pool
+from manim_validate import preload_star_imports
+import problem_extraction
+from service_chat import (
+    ConversationNotFoundError,
+    converse,
+    get_links,
+    prepare_conversation,
+    stream_conversation,
+)
 from service_manim import generate_manim_video
+import upload_store
 
 import dotenv
 
@@ -17,7 +34,13 @@ from pydantic import BaseModel
 
 
 class ChatRequest(BaseModel):
-    chat_history: List[Dict[str, str]]
+    # Full transcript, needed to start a conversation (or restart an expired one)
+    chat_history: List[Dict[str, str]] = []
+    # New user message of a follow-up turn in `conversation_id`
+    message: Optional[str] = None
+    conversation_id: Optional[str] = None
+    # Image from `POST /uploads` to discuss, sent when starting a conversation
+    upload_id: Optional[str] = None
 
 
 class ChatMessage(BaseModel):
@@ -25,7 +48,25 @@ class ChatMessage(BaseModel):
     content: str
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the agent graph once, requests share it
+    agent_registry.load()
+    problem_extraction.agent_registry.load()
+
+    # Fork the render workers before the first request needs them
+    if RENDER_BACKEND == "pool":
+        await render_pool.start()
+
+    # Resolve `from manim import *` once, off the event loop
+    await asyncio.to_thread(preload_star_imports)
+
+    yield
+
+    render_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -42,31 +83,91 @@ async def read_root():
     return {"Hello": "World"}
 
 
+async def _video_payload(
+    render_job: RenderJob, encoding: Optional[str]
+) -> Dict[str, Any]:
+    """Describes a rendered video, inlining it only for base64 compatibility mode."""
+    payload: Dict[str, Any] = {
+        "video_id": render_job.render_id,
+        "video_url": f"/videos/{render_job.render_id}",
+        "status": "success",
+    }
+
+    if encoding == "base64":
+        payload["video_data"] = await asyncio.to_thread(fetch_video, render_job)
+
+    return payload
+
+
+async def _read_image(
+    image: Optional[UploadFile], upload_id: Optional[str]
+) -> bytes:
+    """Reads the image of a request, sent either as a file or as an upload id.
+
+    Returns empty bytes when the request has no image.
+    """
+    if upload_id:
+        image_bytes = await asyncio.to_thread(upload_store.load, upload_id)
+        if image_bytes is None:
+            raise HTTPException(status_code=404, detail=f"Unknown upload: {upload_id}")
+        print(f"Using upload {upload_id[:12]} ({len(image_bytes)} bytes)")
+        return image_bytes
+
+    if not image:
+        return b""
+
+    try:
+        image_bytes = await image.read()
+        print(f"Read image size: {len(image_bytes)} bytes")
+    except Exception as img_error:
+        print(f"Error reading image file: {img_error}")
+        raise HTTPException(
+            status_code=400, detail=f"Failed to read image file: {str(img_error)}"
+        )
+    return image_bytes
+
+
+@app.post("/uploads", status_code=201)
+async def upload(image: UploadFile = File(...)):
+    """Endpoint for uploading an image once and referencing it by id afterwards.
+
+    The id is the sha256 of the image, so uploading the same image again
+    returns the same id. `/links`, `/manim`, `/manim/jobs` and `/chat` accept
+    the id as `upload_id` in place of the image.
+    """
+    print(f"--- API HIT: /uploads ---")
+    image_bytes = await _read_image(image, None)
+
+    if not image_bytes:
+        raise HTTPException(status_code=400, detail="The image file is empty")
+    if len(image_bytes) > upload_store.UPLOAD_MAX_FILE_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image larger than {upload_store.UPLOAD_MAX_FILE_BYTES} bytes",
+        )
+
+    upload_id = await asyncio.to_thread(upload_store.save, image_bytes)
+    print(f"Stored upload {upload_id[:12]}")
+    return {"upload_id": upload_id, "size": len(image_bytes), "status": "success"}
+
+
 @app.post("/links")
 async def links(
-    context: Optional[str] = Form(""), image: Optional[UploadFile] = File(None)
+    context: Optional[str] = Form(""),
+    image: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
 ):
     """Endpoint for getting relevant educational links based on text context or image."""
     try:
         print(f"--- API HIT: /links ---")
         print(f"Text context received: {context[:50] if context else 'None'}...")
-        print(f"Image file received: {image.filename if image else 'No'}")
+        print(f"Image file received: {image.filename if image else upload_id or 'No'}")
 
         # Process uploaded image if provided
-        image_bytes = b""
-        if image:
-            try:
-                image_bytes = await image.read()
-                print(f"Read image size: {len(image_bytes)} bytes")
-            except Exception as img_error:
-                print(f"Error reading image file: {img_error}")
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Failed to read image file: {str(img_error)}",
-                )
+        image_bytes = await _read_image(image, upload_id)
 
         # Validate input - must have either text or image
-        if not context and not image:
+        if not context and not image_bytes:
             raise HTTPException(
                 status_code=400, detail="Must provide either text context or image file"
             )
@@ -85,69 +186,127 @@ async def links(
         raise HTTPException(status_code=500, detail=f"Failed to fetch links: {str(e)}")
 
 
+def _validate_chat_request(data: ChatRequest) -> None:
+    """Rejects chat requests without a message or with malformed history."""
+    if not data.chat_history and not data.message:
+        raise HTTPException(
+            status_code=400, detail="Must provide either chat_history or message"
+        )
+
+    # Validate chat history format
+    for i, message in enumerate(data.chat_history):
+        if (
+            not isinstance(message, dict)
+            or "role" not in message
+            or "content" not in message
+        ):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid message format at index {i}. Expected dict with 'role' and 'content' keys.",
+            )
+
+
 @app.post("/chat")
 async def chat(data: ChatRequest):
-    """Endpoint for handling chat conversations about educational problems."""
+    """Endpoint for handling chat conversations about educational problems.
+
+    The response carries a `conversation_id`. Follow-up turns only need to send
+    that id with the new `message`; an unknown (e.g. expired) conversation is
+    answered with 404, after which the client resends the full `chat_history`.
+    """
     try:
         print(f"--- API HIT: /chat ---")
+        print(f"Conversation: {data.conversation_id or '(new)'}")
         print(f"Chat history length: {len(data.chat_history)}")
 
-        # Validate chat history format
-        for i, message in enumerate(data.chat_history):
-            if (
-                not isinstance(message, dict)
-                or "role" not in message
-                or "content" not in message
-            ):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid message format at index {i}. Expected dict with 'role' and 'content' keys.",
-                )
+        _validate_chat_request(data)
+        image_bytes = await _read_image(None, data.upload_id)
 
         # Process conversation using the conversation agent
-        response_data = await converse(data.chat_history)
+        response_data = await converse(
+            data.chat_history,
+            image_data=image_bytes,
+            message=data.message,
+            conversation_id=data.conversation_id,
+        )
 
         print(f"Generated response length: {len(response_data.get('response', ''))}")
         return {**response_data, "status": "success"}
 
     except HTTPException:
         raise  # Re-raise HTTP exceptions
+    except ConversationNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         print(f"Error in /chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to process chat: {str(e)}")
 
 
+@app.post("/chat/stream")
+async def chat_stream(data: ChatRequest):
+    """Endpoint for chat conversations streaming the answer as Server-Sent Events.
+
+    Takes the same body as `/chat`. Emits a `start` event with the
+    `conversation_id`, a `delta` event with each chunk of text as the model
+    produces it, and a final `done` event with the same payload as `/chat`.
+    """
+    print(f"--- API HIT: /chat/stream ---")
+    print(f"Conversation: {data.conversation_id or '(new)'}")
+    print(f"Chat history length: {len(data.chat_history)}")
+
+    _validate_chat_request(data)
+    image_bytes = await _read_image(None, data.upload_id)
+
+    # Resolve the conversation up front so unknown ids still get a plain 404
+    try:
+        conversation_id, content = await prepare_conversation(
+            data.chat_history,
+            image_data=image_bytes,
+            message=data.message,
+            conversation_id=data.conversation_id,
+        )
+    except ConversationNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    async def event_stream():
+        async for event, payload in stream_conversation(conversation_id, content):
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/manim")
-async def manim(context: Optional[str] = Form(""), image: Optional[UploadFile] = File(None)):
-    """Endpoint for generating a Manim video based on uploaded image and context."""
+async def manim(
+    context: Optional[str] = Form(""),
+    image: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+    encoding: Optional[str] = None,
+):
+    """Endpoint for generating a Manim video based on uploaded image and context.
+
+    Responds with the URL of the video, or with the base64 encoded video itself
+    when called with `?encoding=base64`.
+    """
     try:
         print(f"--- API HIT: /manim ---")
         print(f"Context received: {context[:50]}...")
         # print(f"Image file received: {image.filename}")
 
-        if image:
-            # Read the uploaded image
-            try:
-                image_bytes: bytes = await image.read()
-                print(f"Read image size: {len(image_bytes)} bytes")
-            except Exception as img_error:
-                print(f"Error reading image file: {img_error}")
-                raise HTTPException(
-                    status_code=400, detail=f"Failed to read image file: {str(img_error)}"
-                )
-
-            encoded_image: str = base64.b64encode(image_bytes).decode("utf-8")
-
-            # Generate video using the manim service
-            print("Generating Manim video...")
-            result: str = await generate_manim_video(encoded_image, context)
-        
-        else:
-            result: str = await generate_manim_video(None, context)
-
-        print(f"Generated video size: {len(result)} bytes")
+        # Read the uploaded image
+        image_bytes = await _read_image(image, upload_id)
+
+        # Generate video using the manim service
+        print("Generating Manim video...")
+        result: RenderJob = await generate_manim_video(image_bytes or None, context)
+
+        print(f"Generated video size: {os.path.getsize(result.video_path)} bytes")
         print("Returning Manim video...")
-        return {"video_data": result, "status": "success"}
+        return await _video_payload(result, encoding)
 
     except HTTPException:
         raise  # Re-raise HTTP exceptions
@@ -158,5 +317,96 @@ async def manim(context: Optional[str] = Form(""), image: Optional[UploadFile] =
         )
 
 
+@app.post("/manim/jobs", status_code=202)
+async def submit_manim_job(
+    context: Optional[str] = Form(""),
+    image: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+):
+    """Endpoint for submitting a Manim video generation job without waiting for it."""
+    print(f"--- API HIT: /manim/jobs ---")
+    print(f"Context received: {context[:50] if context else 'None'}...")
+
+    image_bytes = await _read_image(image, upload_id)
+    if not image_bytes and not context:
+        raise HTTPException(
+            status_code=400, detail="Must provide either text context or image file"
+        )
+
+    job = job_manager.submit(generate_manim_video, image_bytes or None, context)
+    print(f"Submitted Manim job {job.job_id}")
+    return {**job.to_dict(), "status_url": f"/manim/jobs/{job.job_id}"}
+
+
+@app.get("/manim/metrics")
+async def manim_metrics():
+    """Endpoint reporting render failures by category and the recoveries tried."""
+    return render_metrics.to_dict()
+
+
+@app.get("/manim/jobs/{job_id}")
+async def manim_job_status(job_id: str):
+    """Endpoint for polling the status and pipeline stage of a Manim job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+    return job.to_dict()
+
+
+@app.get("/manim/jobs/{job_id}/result")
+async def manim_job_result(job_id: str, encoding: Optional[str] = None):
+    """Endpoint for collecting the video produced by a finished Manim job.
+
+    Responds with the URL of the video, or with the base64 encoded video itself
+    when called with `?encoding=base64`.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+    if job.status == JobStatus.FAILED:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to generate video: {job.error}"
+        )
+
+    if job.status != JobStatus.SUCCEEDED:
+        raise HTTPException(
+            status_code=409, detail=f"Job {job_id} is still {job.status.value}"
+        )
+
+    return await _video_payload(job.result, encoding)
+
+
+@app.get("/videos/{video_id}")
+async def video(video_id: str, request: Request):
+    """Endpoint for streaming a rendered video straight from disk.
+
+    Supports `Range` requests so players can start playing and seek before the
+    whole file is downloaded, and `If-None-Match` revalidation through the ETag.
+    """
+    render_job = find_render_job(video_id)
+    if render_job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown video: {video_id}")
+
+    response = FileResponse(
+        render_job.video_path,
+        media_type="video/mp4",
+        stat_result=os.stat(render_job.video_path),
+        headers={"Cache-Control": "private, max-age=86400"},
+    )
+
+    if request.headers.get("if-none-match") == response.headers["etag"]:
+        return Response(
+            status_code=304,
+            headers={
+                "ETag": response.headers["etag"],
+                "Cache-Control": response.headers["cache-control"],
+            },
+        )
+
+    return response
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
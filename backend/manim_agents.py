@@ -1,29 +1,45 @@
-import random
+import asyncio
 
-from google.adk import Runner
 from google.adk.agents import Agent
 from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
 from google.adk.models.llm_response import LlmResponse
-from google.adk.sessions import InMemorySessionService
 from google.adk.tools.agent_tool import AgentTool
 
-from manim_gen import compile_code_to_video, parse_text_to_code, write_code_to_file
-from manim_utils import Timer, load_prompt_template
+import llm_cache
+from agent_registry import AgentRegistry
+from manim_errors import ErrorCategory, RenderError, render_metrics
+from manim_gen import (
+    current_render_job,
+    parse_text_to_code,
+    render_script,
+    write_code_to_file,
+)
+from manim_jobs import JobStage, record_timing, set_stage
+from manim_utils import Timer
 
 GEMINI_FLASH = "gemini-2.5-flash"
 GEMINI_PRO = "gemini-2.5-pro"
 
-USER_ID = str(random.randint(1, 1000000))
-SESSION_ID = str(random.randint(1, 1000000))
+USER_ID = "ManimVideoAgent"
 APP_NAME = "manim-video-generator"
 
+# Prompt template of each agent
+TEMPLATE_PATHS = {
+    "math_agent": "templates/math.md",
+    "script_agent": "templates/script.md",
+    "video_agent": "templates/video.md",
+    "orchestrator_agent": "templates/orchestrator.md",
+}
+
 
 def agent_invoke_callback(callback_context: CallbackContext) -> None:
     agent_name = callback_context.agent_name
     print(f"Agent {agent_name} invoked")
+    set_stage(agent_name)
 
 
-def agent_response_callback(
+async def agent_response_callback(
     callback_context: CallbackContext, llm_response: LlmResponse
 ) -> None:
     agent_name = callback_context.agent_name
@@ -41,48 +57,99 @@ def agent_response_callback(
 
     response_text = llm_response.content.parts[0].text
 
-    # Write the response text to a file
-    code = parse_text_to_code(response_text)
-    file_name = write_code_to_file(code)
-    print(f"Code written to file: {file_name}")
+    # Write the response text to a file and compile it. Failures are recorded
+    # on the render job rather than raised, so they can be repaired
+    render_job = current_render_job()
+    set_stage(JobStage.COMPILING)
+    with Timer("Compile Code to Video") as timer:
+        try:
+            code = parse_text_to_code(response_text)
+        except ValueError as e:
+            print(f"No code found in the response of {agent_name}")
+            render_job.failure = RenderError(ErrorCategory.RESPONSE, str(e))
+            render_metrics.record_render(render_job.failure)
+        else:
+            file_path = write_code_to_file(code, render_job)
+            print(f"Code written to file: {file_path}")
+            await render_script(render_job)
+    record_timing("compiling", timer.duration)
+
+
+async def video_cache_callback(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> LlmResponse | None:
+    """
+    Answers the video agent from the LLM cache. A hit skips the after model
+    callbacks, so the cached script is rendered here; if it no longer renders
+    it is dropped from the cache.
+    """
+    llm_response = await llm_cache.before_model_callback(callback_context, llm_request)
+    if llm_response is not None:
+        await agent_response_callback(callback_context, llm_response)
+        if not current_render_job().compiled:
+            key = llm_cache.request_key(llm_request)
+            if key is not None:
+                await asyncio.to_thread(llm_cache.invalidate, key)
+    return llm_response
 
-    # Compile the code to a video
-    with Timer("Compile Code to Video"):
-        compile_code_to_video(file_name)
 
+async def cache_rendered_response(
+    callback_context: CallbackContext, llm_response: LlmResponse
+) -> None:
+    """Caches a video agent response only if its script rendered."""
+    if current_render_job().compiled:
+        await llm_cache.after_model_callback(callback_context, llm_response)
+
+
+def initialize_agents(templates: dict[str, str]) -> dict[str, Agent]:
+    """
+    Builds the agent graph from the prompt template of each agent.
+
+    Args:
+        templates: dict[str, str] - The instruction of each agent, by agent name.
 
-def initialize_agent() -> Agent:
+    Returns:
+        dict[str, Agent]: Every agent by name. The orchestrator agent uses the
+            other agents as tools, which can also be run on their own.
+    """
     # Math breakdown agent
     math_agent = Agent(
         model=GEMINI_FLASH,
         name="math_agent",
-        instruction=load_prompt_template("templates/math.md"),
+        instruction=templates["math_agent"],
         before_agent_callback=agent_invoke_callback,
+        before_model_callback=llm_cache.before_model_callback,
+        after_model_callback=llm_cache.after_model_callback,
     )
 
     # Script writing agent
     script_agent = Agent(
         model=GEMINI_FLASH,
         name="script_agent",
-        instruction=load_prompt_template("templates/script.md"),
+        instruction=templates["script_agent"],
         before_agent_callback=agent_invoke_callback,
+        before_model_callback=llm_cache.before_model_callback,
+        after_model_callback=llm_cache.after_model_callback,
     )
 
     # Video generation agent
     video_agent = Agent(
         model=GEMINI_FLASH,
         name="video_agent",
-        instruction=load_prompt_template("templates/video.md"),
+        instruction=templates["video_agent"],
         before_agent_callback=agent_invoke_callback,
-        after_model_callback=agent_response_callback,
+        before_model_callback=video_cache_callback,
+        after_model_callback=[agent_response_callback, cache_rendered_response],
     )
 
     # Orchestrator agent
     orchestrator_agent = Agent(
         model=GEMINI_FLASH,
         name="orchestrator_agent",
-        instruction=load_prompt_template("templates/orchestrator.md"),
+        instruction=templates["orchestrator_agent"],
         before_agent_callback=agent_invoke_callback,
+        before_model_callback=llm_cache.before_model_callback,
+        after_model_callback=llm_cache.after_model_callback,
         tools=[
             AgentTool(agent=math_agent),
             AgentTool(agent=script_agent),
@@ -90,26 +157,10 @@ def initialize_agent() -> Agent:
         ],
     )
 
-    return orchestrator_agent
-
-
-async def prepare_session() -> Runner:
-    """
-    Prepares a session for the agent to use.
+    return {
+        agent.name: agent
+        for agent in (math_agent, script_agent, video_agent, orchestrator_agent)
+    }
 
-    This function initializes the agent and an in-memory session service,
-    and then creates a session for the agent to use. The created session
-    is then used to create a runner for the agent, which is returned.
-
-    Returns:
-        Runner: The runner for the agent.
-    """
-    with Timer("Initialize Agents"):
-        agent = initialize_agent()
-    session_service = InMemorySessionService()
-    runner = Runner(app_name=APP_NAME, session_service=session_service, agent=agent)
-    await session_service.create_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
 
-    return runner
+agent_registry = AgentRegistry(APP_NAME, TEMPLATE_PATHS, initialize_agents)
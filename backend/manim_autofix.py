@@ -0,0 +1,451 @@
+import ast
+import io
+import re
+import tokenize
+from dataclasses import dataclass
+
+# font_size values below this are scale factors (e.g. 0.8), not point sizes
+FONT_SIZE_SCALE_LIMIT = 5
+
+# Names from older manim versions and their manim Community replacements
+DEPRECATED_NAMES = {
+    "ShowCreation": "Create",
+    "TextMobject": "Text",
+    "TexMobject": "MathTex",
+}
+
+# Axes methods renamed in manim Community, with the call replacing them
+DEPRECATED_METHODS = {
+    "get_graph": "plot",
+}
+
+# Mobjects with the methods of `DEPRECATED_METHODS`
+AXES_CLASSES = {"Axes", "NumberPlane", "ThreeDAxes", "ComplexPlane", "PolarPlane"}
+
+# Mobjects whose string arguments are LaTeX
+LATEX_CLASSES = {"MathTex", "Tex"}
+
+# A LaTeX command (e.g. \frac) in a string that should have been raw
+LATEX_COMMAND = re.compile(r"\\[a-zA-Z]")
+
+# Keyword arguments of MathTex/Tex that Text accepts as well
+TEXT_KEYWORDS = {"color", "font_size", "opacity", "fill_opacity", "stroke_width"}
+
+# Argument-less methods that no longer exist, with the call replacing them
+REMOVED_METHOD_CALLS = {
+    "to_center": "move_to(ORIGIN)",
+}
+
+
+@dataclass
+class AutoFix:
+    """A defect fixed in a script, reported so prompts can be improved."""
+
+    rule: str
+    line: int
+    description: str
+
+
+@dataclass
+class _Edit:
+    start: tuple[int, int]
+    end: tuple[int, int]
+    text: str
+
+
+def _is_scale_factor(node: ast.expr) -> bool:
+    return (
+        isinstance(node, ast.Constant)
+        and isinstance(node.value, (int, float))
+        and not isinstance(node.value, bool)
+        and 0 < node.value < FONT_SIZE_SCALE_LIMIT
+    )
+
+
+def _replace(node: ast.AST, text: str) -> _Edit:
+    return _Edit(
+        (node.lineno, node.col_offset), (node.end_lineno, node.end_col_offset), text
+    )
+
+
+def _font_size_fixes(module: ast.Module) -> list[tuple[_Edit, AutoFix]]:
+    """`font_size=0.8` (or a constant holding 0.8) becomes a scaled default."""
+    fixes = []
+
+    for node in ast.walk(module):
+        if (
+            isinstance(node, ast.keyword)
+            and node.arg == "font_size"
+            and _is_scale_factor(node.value)
+        ):
+            value = node.value
+            fixes.append(
+                (
+                    _replace(value, f"DEFAULT_FONT_SIZE * {value.value}"),
+                    AutoFix(
+                        "font-size-scale",
+                        value.lineno,
+                        f"font_size={value.value} scaled from DEFAULT_FONT_SIZE",
+                    ),
+                )
+            )
+
+    # Module constants holding a scale factor, fixed if only used as font_size
+    font_size_loads = _count_font_size_loads(module)
+    for node in module.body:
+        if not (
+            isinstance(node, ast.Assign)
+            and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name)
+            and _is_scale_factor(node.value)
+        ):
+            continue
+
+        name = node.targets[0].id
+        uses = font_size_loads.get(name, 0)
+        if uses == 0 or uses != _count_loads(module, name):
+            continue  # Not a font size, or also used elsewhere (e.g. as a scale)
+
+        fixes.append(
+            (
+                _replace(node.value, f"DEFAULT_FONT_SIZE * {node.value.value}"),
+                AutoFix(
+                    "font-size-scale",
+                    node.lineno,
+                    f"{name} = {node.value.value} scaled from DEFAULT_FONT_SIZE",
+                ),
+            )
+        )
+
+    return fixes
+
+
+def _count_font_size_loads(module: ast.Module) -> dict[str, int]:
+    counts: dict[str, int] = {}
+    for node in ast.walk(module):
+        if (
+            isinstance(node, ast.keyword)
+            and node.arg == "font_size"
+            and isinstance(node.value, ast.Name)
+        ):
+            counts[node.value.id] = counts.get(node.value.id, 0) + 1
+    return counts
+
+
+def _count_loads(module: ast.Module, name: str) -> int:
+    return sum(
+        1
+        for node in ast.walk(module)
+        if isinstance(node, ast.Name)
+        and isinstance(node.ctx, ast.Load)
+        and node.id == name
+    )
+
+
+def _defined_names(module: ast.Module) -> set[str]:
+    """The names a script defines itself: classes, functions, variables, attributes."""
+    names = set()
+    for node in ast.walk(module):
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        elif isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store):
+            names.add(node.attr)
+    return names
+
+
+def _is_axes(node: ast.expr) -> bool:
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in AXES_CLASSES
+    )
+
+
+def _axes_expressions(module: ast.Module) -> set[str]:
+    """The source of the variables holding axes, e.g. `axes` or `self.plane`."""
+    expressions = set()
+    for node in ast.walk(module):
+        if isinstance(node, ast.Assign) and _is_axes(node.value):
+            expressions.update(
+                ast.unparse(target)
+                for target in node.targets
+                if isinstance(target, (ast.Name, ast.Attribute))
+            )
+    return expressions
+
+
+def _deprecated_api_fixes(
+    module: ast.Module, manim_names: bool
+) -> list[tuple[_Edit, AutoFix]]:
+    """
+    Renames classes and methods removed from manim Community. Fixes that bring
+    in new manim names are only made when `manim_names` are star imported.
+    Names the script defines itself are never renamed, and axes methods only
+    when they are called on axes.
+    """
+    fixes = []
+    defined = _defined_names(module)
+    axes = _axes_expressions(module)
+
+    for node in ast.walk(module):
+        if (
+            manim_names
+            and isinstance(node, ast.Name)
+            and isinstance(node.ctx, ast.Load)
+            and node.id in DEPRECATED_NAMES
+            and node.id not in defined
+        ):
+            replacement = DEPRECATED_NAMES[node.id]
+            fixes.append(
+                (
+                    _replace(node, replacement),
+                    AutoFix(
+                        "deprecated-api",
+                        node.lineno,
+                        f"{node.id} replaced by {replacement}",
+                    ),
+                )
+            )
+            continue
+
+        if not (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr not in defined
+        ):
+            continue
+
+        func = node.func
+        # The attribute node ends with the method name, on the same line
+        name_start = (func.end_lineno, func.end_col_offset - len(func.attr))
+
+        if func.attr in DEPRECATED_METHODS and (
+            _is_axes(func.value) or ast.unparse(func.value) in axes
+        ):
+            replacement = DEPRECATED_METHODS[func.attr]
+            edit = _Edit(
+                name_start, (func.end_lineno, func.end_col_offset), replacement
+            )
+        elif (
+            manim_names
+            and func.attr in REMOVED_METHOD_CALLS
+            and not (node.args or node.keywords)
+        ):
+            replacement = REMOVED_METHOD_CALLS[func.attr]
+            edit = _Edit(
+                name_start, (node.end_lineno, node.end_col_offset), replacement
+            )
+        else:
+            continue
+
+        fixes.append(
+            (
+                edit,
+                AutoFix(
+                    "deprecated-api",
+                    node.lineno,
+                    f".{func.attr}() replaced by .{replacement.split('(')[0]}()",
+                ),
+            )
+        )
+
+    return fixes
+
+
+def _is_single_plain_literal(segment: str) -> bool:
+    """Whether source text is one string literal without prefix (no "a" "b")."""
+    if not segment.startswith(("'", '"')):
+        return False
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(segment).readline))
+    except (tokenize.TokenError, SyntaxError):
+        return False
+    return sum(token.type == tokenize.STRING for token in tokens) == 1
+
+
+def _raw_latex_fixes(module: ast.Module, code: str) -> list[tuple[_Edit, AutoFix]]:
+    r"""
+    `MathTex("\frac{1}{2}")` loses its backslashes to Python escapes (\f is a
+    form feed), making it a raw string restores the LaTeX the model meant.
+    Literals escaping their backslashes properly (\\frac) are left alone.
+    """
+    fixes = []
+
+    for node in ast.walk(module):
+        if not (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in LATEX_CLASSES
+        ):
+            continue
+
+        for arg in node.args:
+            if not (isinstance(arg, ast.Constant) and isinstance(arg.value, str)):
+                continue
+            segment = ast.get_source_segment(code, arg)
+            if (
+                segment is None
+                or "\\\\" in segment
+                or not LATEX_COMMAND.search(segment)
+                or not _is_single_plain_literal(segment)
+            ):
+                continue
+
+            fixes.append(
+                (
+                    _replace(arg, f"r{segment}"),
+                    AutoFix(
+                        "raw-latex-string",
+                        arg.lineno,
+                        f"{node.func.id} string {segment} made raw",
+                    ),
+                )
+            )
+
+    return fixes
+
+
+def _manim_imports(module: ast.Module) -> tuple[bool, bool]:
+    """Whether the script imports manim at all, and with `from manim import *`."""
+    imports_manim = star_import = False
+    for node in ast.walk(module):
+        if isinstance(node, ast.ImportFrom) and node.module == "manim":
+            imports_manim = True
+            star_import |= any(alias.name == "*" for alias in node.names)
+        elif isinstance(node, ast.Import) and any(
+            alias.name.split(".")[0] == "manim" for alias in node.names
+        ):
+            imports_manim = True
+    return imports_manim, star_import
+
+
+def _import_line(module: ast.Module) -> int:
+    """The line to insert an import at: after the docstring and __future__."""
+    line = 1
+    for index, node in enumerate(module.body):
+        is_docstring = (
+            index == 0
+            and isinstance(node, ast.Expr)
+            and isinstance(node.value, ast.Constant)
+            and isinstance(node.value.value, str)
+        )
+        is_future = isinstance(node, ast.ImportFrom) and node.module == "__future__"
+        if not (is_docstring or is_future):
+            break
+        line = node.end_lineno + 1
+    return line
+
+
+def _apply_edits(code: str, edits: list[_Edit]) -> str:
+    # ast offsets are UTF-8 byte offsets within a line
+    lines = [line.encode("utf-8") for line in code.split("\n")]
+
+    for edit in sorted(edits, key=lambda e: e.start, reverse=True):
+        (start_line, start_col), (end_line, end_col) = edit.start, edit.end
+        head = lines[start_line - 1][:start_col]
+        tail = lines[end_line - 1][end_col:]
+        lines[start_line - 1 : end_line] = [head + edit.text.encode("utf-8") + tail]
+
+    return "\n".join(line.decode("utf-8") for line in lines)
+
+
+def autofix_script(code: str) -> tuple[str, list[AutoFix]]:
+    """
+    Rewrites mechanically fixable defects of a generated script in place:
+    font sizes given as scale factors, deprecated manim API names, LaTeX in
+    non-raw strings and a missing `from manim import *`.
+
+    Fixes are applied as edits on the source, so the rest of the script keeps
+    its formatting and comments. Scripts that do not parse, or need no fix,
+    are returned as is.
+
+    Args:
+        code: str - The source code of the script.
+
+    Returns:
+        tuple[str, list[AutoFix]] - The fixed script, and the fixes applied.
+    """
+    try:
+        module = ast.parse(code)
+    except SyntaxError:
+        return code, []
+
+    # Fixes may use manim names (DEFAULT_FONT_SIZE, Create...), which are only
+    # available through a star import, added below when manim is not imported
+    imports_manim, star_import = _manim_imports(module)
+    manim_names = star_import or not imports_manim
+
+    fixes = [
+        *_deprecated_api_fixes(module, manim_names),
+        *_raw_latex_fixes(module, code),
+    ]
+    if manim_names:
+        fixes.extend(_font_size_fixes(module))
+    fixed_code = _apply_edits(code, [edit for edit, _ in fixes])
+    applied = [fix for _, fix in fixes]
+
+    if not imports_manim:
+        lines = fixed_code.split("\n")
+        line = _import_line(module)
+        lines.insert(line - 1, "from manim import *")
+        fixed_code = "\n".join(lines)
+        applied.append(AutoFix("missing-import", line, "Added 'from manim import *'"))
+
+    return fixed_code, sorted(applied, key=lambda fix: fix.line)
+
+
+def tex_fallback(code: str, tex_string: str) -> tuple[str, list[AutoFix]]:
+    """
+    Typesets a LaTeX string that failed to compile as plain text, so the rest
+    of the video can still render. Only single string `MathTex`/`Tex` calls
+    are replaced, calls splitting the formula into parts are likely indexed
+    later on and are left to the video agent.
+
+    Args:
+        code: str - The source code of the script.
+        tex_string: str - The LaTeX string that failed, as written in the script.
+
+    Returns:
+        tuple[str, list[AutoFix]] - The fixed script, and the fixes applied
+            (none if the string was not found in a replaceable call).
+    """
+    try:
+        module = ast.parse(code)
+    except SyntaxError:
+        return code, []
+
+    fixes = []
+    for node in ast.walk(module):
+        if not (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in LATEX_CLASSES
+            and len(node.args) == 1
+            and isinstance(node.args[0], ast.Constant)
+            and node.args[0].value == tex_string
+        ):
+            continue
+
+        # Keywords Text does not know (e.g. tex_to_color_map) are dropped
+        arguments = [ast.get_source_segment(code, node.args[0])]
+        arguments.extend(
+            ast.get_source_segment(code, keyword)
+            for keyword in node.keywords
+            if keyword.arg in TEXT_KEYWORDS
+        )
+        fixes.append(
+            (
+                _replace(node, f"Text({', '.join(arguments)})"),
+                AutoFix(
+                    "tex-fallback",
+                    node.lineno,
+                    f"{node.func.id} string {tex_string!r} typeset as plain text",
+                ),
+            )
+        )
+
+    if not fixes:
+        return code, []
+    return _apply_edits(code, [edit for edit, _ in fixes]), [fix for _, fix in fixes]
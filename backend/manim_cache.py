@@ -0,0 +1,87 @@
+import ast
+import hashlib
+import json
+import os
+import shutil
+
+from manim_utils import atomic_write, prune_directory_lru, touch
+
+CACHE_DIR = "./manim/cache/"
+
+# Upper bound for the rendered videos kept in the cache
+CACHE_MAX_BYTES = int(os.getenv("MANIM_CACHE_MAX_BYTES", str(2 * 1024**3)))
+
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+
+def normalize_script(code: str) -> str:
+    """
+    Normalizes a script so formatting and comment only differences map to the
+    same cache entry.
+
+    Scripts that do not parse are normalized by stripping trailing whitespace.
+    """
+    try:
+        return ast.unparse(ast.parse(code))
+    except (SyntaxError, ValueError):
+        lines = [line.rstrip() for line in code.replace("\r\n", "\n").split("\n")]
+        return "\n".join(lines).strip()
+
+
+def cache_key(code: str, settings: dict) -> str:
+    """
+    Computes the cache key of a script rendered with the given settings.
+
+    Args:
+        code: str - The source code of the script.
+        settings: dict - Anything affecting the rendered output (quality, fps...).
+
+    Returns:
+        str - The hex digest identifying the rendered video.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_script(code).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.mp4")
+
+
+def lookup(key: str) -> str | None:
+    """
+    Returns the path of the cached video for a key, or None on a cache miss.
+    """
+    path = _cache_path(key)
+    if not touch(path):
+        return None
+    return path
+
+
+def store(key: str, video_path: str) -> None:
+    """
+    Adds a rendered video to the cache and evicts the least recently used
+    videos if the cache grew past `CACHE_MAX_BYTES`.
+    """
+    with atomic_write(_cache_path(key)) as temp_path:
+        shutil.copyfile(video_path, temp_path)
+
+    evicted = prune_directory_lru(CACHE_DIR, CACHE_MAX_BYTES)
+    if evicted:
+        print(f"Evicted {evicted} videos from the render cache")
+
+
+def link_into_place(cached_path: str, video_path: str) -> None:
+    """
+    Makes a cached video available at `video_path`, hard linking when possible.
+    """
+    os.makedirs(os.path.dirname(video_path), exist_ok=True)
+    if os.path.exists(video_path):
+        os.remove(video_path)
+
+    try:
+        os.link(cached_path, video_path)
+    except OSError:
+        shutil.copyfile(cached_path, video_path)
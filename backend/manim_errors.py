@@ -0,0 +1,307 @@
+import ast
+import os
+import re
+import signal
+from enum import Enum
+from typing import Any
+
+# Last line of a Python traceback, e.g. "NameError: name 'x' is not defined"
+EXCEPTION_LINE = re.compile(
+    r"^(?P<type>[A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt))"
+    r"(?:: ?(?P<message>.*))?$"
+)
+
+# The log file manim points to when LaTeX fails to compile
+LATEX_LOG_FILE = re.compile(
+    r"error converting to \w+\..*the log file: (?P<path>\S+\.log)"
+)
+
+# Prefix of the log of a failed concatenation of section videos
+CONCAT_FAILURE_PREFIX = "ffmpeg concat failed:"
+
+# Added to the log of a render subprocess that was killed by a signal
+KILLED_BY_SIGNAL = re.compile(r"Render killed by signal (?P<signal>\d+)")
+
+# Exceptions raised by the video encoder (PyAV wraps ffmpeg)
+FFMPEG_EXCEPTION_PREFIXES = ("av.", "PyAV")
+
+
+class ErrorCategory(str, Enum):
+    # The agent response held no usable code block
+    RESPONSE = "response"
+    # The script was rejected by the static validation
+    VALIDATION = "validation"
+    # The script raised while building or playing the scene
+    PYTHON = "python"
+    # A MathTex/Tex string failed to compile
+    LATEX = "latex"
+    # Encoding or joining the video failed
+    FFMPEG = "ffmpeg"
+    # The render took too long and was stopped
+    TIMEOUT = "timeout"
+    # The render ran out of its CPU time or memory
+    RESOURCE_LIMIT = "resource_limit"
+    # The render worker died (e.g. killed by the OS)
+    WORKER_CRASH = "worker_crash"
+    UNKNOWN = "unknown"
+
+
+class Recovery(str, Enum):
+    """How a failed render is recovered, cheapest first."""
+
+    # Render the same script again, the failure was not the script's fault
+    RETRY_RENDER = "retry_render"
+    # Typeset the failing LaTeX string as plain text instead
+    TEX_FALLBACK = "tex_fallback"
+    # Send the script and the error back to the video agent
+    LLM_REPAIR = "llm_repair"
+
+
+class RenderError(Exception):
+    """
+    A failed render, classified so the service can pick the cheapest recovery
+    and report failures by category.
+    """
+
+    def __init__(
+        self,
+        category: ErrorCategory,
+        message: str,
+        log: str = "",
+        line: int | None = None,
+        tex_string: str | None = None,
+    ):
+        super().__init__(message)
+        self.category = category
+        self.message = message
+        self.log = log or message
+        # Line of the script the error was raised from, if known
+        self.line = line
+        # The LaTeX string that failed to compile, as written in the script
+        self.tex_string = tex_string
+
+    @property
+    def recovery(self) -> Recovery:
+        if self.category in (ErrorCategory.FFMPEG, ErrorCategory.WORKER_CRASH):
+            return Recovery.RETRY_RENDER
+        if self.category == ErrorCategory.LATEX and self.tex_string is not None:
+            return Recovery.TEX_FALLBACK
+        return Recovery.LLM_REPAIR
+
+    def summary(self) -> str:
+        """The classified error, one fact per line, for logs and repair prompts."""
+        lines = [f"Category: {self.category.value}"]
+        if self.line is not None:
+            lines.append(f"Line: {self.line}")
+        if self.tex_string is not None:
+            lines.append(f"LaTeX string: {self.tex_string}")
+        lines.append(f"Error: {self.message}")
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "category": self.category.value,
+            "message": self.message,
+            "line": self.line,
+            "tex_string": self.tex_string,
+            "recovery": self.recovery.value,
+        }
+
+    def __str__(self) -> str:
+        location = f" (line {self.line})" if self.line is not None else ""
+        return f"{self.category.value} error{location}: {self.message}"
+
+
+def _exception_line(log: str) -> tuple[str, str] | None:
+    """The type and message of the last exception in a traceback."""
+    for line in reversed(log.strip().splitlines()):
+        match = EXCEPTION_LINE.match(line.strip())
+        if match:
+            return match["type"], match["message"] or ""
+    return None
+
+
+def _script_line(log: str, script_name: str) -> int | None:
+    """
+    The innermost line of the script in a traceback, from plain tracebacks
+    (`File ".../<script>", line 12`) and manim's rich ones (`<script>:12 in`).
+    """
+    name = re.escape(script_name)
+    frames = re.findall(
+        rf'File "[^"]*{name}", line (\d+)|{name}:(\d+) in ', log
+    )
+    if not frames:
+        return None
+    plain, rich = frames[-1]
+    return int(plain or rich)
+
+
+def _latex_details(log: str, code: str) -> tuple[str | None, str | None]:
+    """
+    The first LaTeX error message and the script string that caused it, read
+    from the tex and log files manim names in its error.
+    """
+    match = LATEX_LOG_FILE.search(log)
+    if match is None:
+        return None, None
+
+    log_path = match["path"]
+    tex_path = os.path.splitext(log_path)[0] + ".tex"
+
+    message = None
+    try:
+        with open(log_path, "r", encoding="utf-8", errors="replace") as file:
+            message = next(
+                (line[2:].strip() for line in file if line.startswith("! ")), None
+            )
+        with open(tex_path, "r", encoding="utf-8") as file:
+            tex = file.read()
+    except OSError:
+        return message, None
+
+    body = tex.partition(r"\begin{document}")[2].partition(r"\end{document}")[0]
+    return message, _find_tex_string(code, body)
+
+
+def _find_tex_string(code: str, tex_body: str) -> str | None:
+    """The longest string of a MathTex/Tex call found in a compiled tex body."""
+    try:
+        module = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    candidates = [
+        arg.value
+        for node in ast.walk(module)
+        if isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in ("MathTex", "Tex")
+        for arg in node.args
+        if isinstance(arg, ast.Constant)
+        and isinstance(arg.value, str)
+        and arg.value.strip()
+    ]
+    found = [string for string in candidates if string.strip() in tex_body]
+    return max(found, key=len, default=None)
+
+
+def _process_failure(log: str) -> RenderError | None:
+    """
+    Classifies failures of the render process itself rather than of the
+    script: crashed pool workers, killed subprocesses and failed joins of
+    section videos.
+    """
+    first_line = log.strip().splitlines()[0] if log.strip() else log
+
+    if log.startswith(CONCAT_FAILURE_PREFIX):
+        return RenderError(ErrorCategory.FFMPEG, first_line, log)
+
+    if "Render worker crashed" in log or "BrokenProcessPool" in log:
+        return RenderError(ErrorCategory.WORKER_CRASH, first_line, log)
+
+    killed = KILLED_BY_SIGNAL.search(log)
+    if killed is not None:
+        # SIGKILL comes from the OOM killer, other signals are crashes
+        category = (
+            ErrorCategory.RESOURCE_LIMIT
+            if int(killed["signal"]) == signal.SIGKILL
+            else ErrorCategory.WORKER_CRASH
+        )
+        return RenderError(category, killed[0], log)
+
+    return None
+
+
+def classify_failure(log: str, script_path: str) -> RenderError:
+    """
+    Classifies the log of a failed render.
+
+    Recognizes worker crashes, killed renders, failed joins of section videos,
+    timeouts, exceeded CPU or memory limits, LaTeX
+    errors (with the offending string of the script), encoder failures and
+    Python exceptions (with the line of the script that raised).
+
+    Args:
+        log: str - The error log of the render (a traceback or manim's stderr).
+        script_path: str - The script that was rendered.
+
+    Returns:
+        RenderError - The classified failure, with the full log attached.
+    """
+    process_failure = _process_failure(log)
+    if process_failure is not None:
+        return process_failure
+
+    exception = _exception_line(log)
+    exception_type, message = exception or ("", log.strip()[-500:])
+    message = message or exception_type
+    line = _script_line(log, os.path.basename(script_path))
+
+    if exception_type.split(".")[-1] == "TimeoutError" or "timed out" in message:
+        return RenderError(ErrorCategory.TIMEOUT, message, log, line)
+
+    if (
+        exception_type.split(".")[-1] in ("MemoryError", "RenderLimitError")
+        or "CPU time limit" in log
+    ):
+        return RenderError(ErrorCategory.RESOURCE_LIMIT, message, log, line)
+
+    if LATEX_LOG_FILE.search(log):
+        code = ""
+        try:
+            with open(script_path, "r", encoding="utf-8") as file:
+                code = file.read()
+        except OSError:
+            pass
+        latex_message, tex_string = _latex_details(log, code)
+        return RenderError(
+            ErrorCategory.LATEX, latex_message or message, log, line, tex_string
+        )
+
+    if exception_type.startswith(FFMPEG_EXCEPTION_PREFIXES) or (
+        exception is None and "ffmpeg" in log.lower()
+    ):
+        return RenderError(ErrorCategory.FFMPEG, message, log)
+
+    if exception is not None:
+        return RenderError(
+            ErrorCategory.PYTHON, f"{exception_type}: {message}", log, line
+        )
+
+    return RenderError(ErrorCategory.UNKNOWN, message, log)
+
+
+class RenderMetrics:
+    """Counts renders, their failures by category and the recoveries tried."""
+
+    def __init__(self):
+        self.renders = 0
+        self.failures: dict[str, int] = {}
+        self.recoveries: dict[str, int] = {}
+        self.recovered: dict[str, int] = {}
+
+    def record_render(self, error: RenderError | None) -> None:
+        self.renders += 1
+        if error is not None:
+            category = error.category.value
+            self.failures[category] = self.failures.get(category, 0) + 1
+
+    def record_recovery(self, recovery: Recovery, succeeded: bool) -> None:
+        self.recoveries[recovery.value] = self.recoveries.get(recovery.value, 0) + 1
+        if succeeded:
+            self.recovered[recovery.value] = self.recovered.get(recovery.value, 0) + 1
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "renders": self.renders,
+            "failures": self.failures,
+            "failure_rate": {
+                category: round(count / self.renders, 4)
+                for category, count in self.failures.items()
+            },
+            "recoveries": self.recoveries,
+            "recovered": self.recovered,
+        }
+
+
+render_metrics = RenderMetrics()
@@ -1,25 +1,244 @@
+import asyncio
 import base64
-import glob
+import contextvars
 import os
-import random
-import subprocess
-import time
+import re
+import signal
+import uuid
+from dataclasses import dataclass
+
+import manim_cache
+from manim_autofix import autofix_script
+from manim_errors import (
+    CONCAT_FAILURE_PREFIX,
+    ErrorCategory,
+    RenderError,
+    classify_failure,
+    render_metrics,
+)
+from manim_jobs import JOB_TTL_SECONDS
+from manim_pool import render_pool
+from manim_sandbox import (
+    RENDER_TIMEOUT,
+    cpu_limit_message,
+    kill_process_group,
+    killed_message,
+    limit_subprocess,
+    timeout_message,
+)
+from manim_sections import SectionPlan, plan_sections
+from manim_tex import RENDER_CONFIG_FILE, precompile_tex
+from manim_utils import Timer, prune_subdirectories_lru, throttled
+from manim_validate import validate_script
 
 SCRIPT_DIR = "./manim/scripts/"
 VIDEO_DIR = "./manim/videos/"
 MEDIA_DUMP_DIR = "./manim/media/"
 
+# Maximum number of manim renders running at the same time
+RENDER_CONCURRENCY = int(
+    os.getenv("MANIM_RENDER_CONCURRENCY", str(os.cpu_count() or 1))
+)
+
+# Everything that affects the rendered video, part of the render cache key
+RENDER_SETTINGS: dict = {
+    "scene": "SolutionAnimation",
+    "quality": "low_quality",
+    "fps": 10,
+}
+
+# Upper bound for the media directories of past renders (section parts, partial
+# movies and final videos). Renders are only evicted once their job has expired.
+MEDIA_MAX_BYTES = int(os.getenv("MANIM_MEDIA_MAX_BYTES", str(5 * 1024**3)))
+
+# Minimum seconds between two evictions of render media, each one walks the
+# media directories of every past render
+MEDIA_PRUNE_INTERVAL_SECONDS = 600
+
+# Section render failures the script causes itself, rendering the whole scene
+# would fail the same way. Other failures (crashed workers, the ffmpeg concat
+# step...) may come from the split, and fall back to rendering the scene whole.
+SCRIPT_FAILURES = {
+    ErrorCategory.PYTHON,
+    ErrorCategory.LATEX,
+    ErrorCategory.TIMEOUT,
+    ErrorCategory.RESOURCE_LIMIT,
+}
+
+# "pool" renders on warm worker processes, "subprocess" launches the manim CLI
+RENDER_BACKEND = os.getenv("MANIM_RENDER_BACKEND", "pool")
+
+# "sections" renders independent sections of a scene in parallel and joins
+# them, "single" always renders the whole scene in one go
+RENDER_MODE = os.getenv("MANIM_RENDER_MODE", "sections")
+
 os.makedirs(SCRIPT_DIR, exist_ok=True)
 os.makedirs(VIDEO_DIR, exist_ok=True)
 os.makedirs(MEDIA_DUMP_DIR, exist_ok=True)
 
 
-def random_chars() -> str:
-    random.seed(time.time())
-    chars: str = ""
-    for _ in range(10):
-        chars += chr(random.randint(97, 122))
-    return chars
+@dataclass
+class RenderJob:
+    """
+    The artifacts of a single render, all derived from a collision free id.
+
+    Every render owns its script, its manim media directory and therefore its
+    output video, so concurrent renders never touch each other's files and
+    finding a video does not require scanning the scripts directory.
+    """
+
+    render_id: str
+    # Set once the video is in place, the agents stop as soon as it is
+    compiled: bool = False
+    # Why the last script failed to compile, picks the recovery in the repair loop
+    failure: RenderError | None = None
+
+    @property
+    def script_path(self) -> str:
+        return f"{SCRIPT_DIR}{self.render_id}.py"
+
+    @property
+    def sections_script_path(self) -> str:
+        """The script with the section sub-scenes, kept apart from the script
+        the agents wrote so repairs only ever see their own code."""
+        return f"{SCRIPT_DIR}{self.render_id}_sections.py"
+
+    @property
+    def media_dir(self) -> str:
+        return f"{MEDIA_DUMP_DIR}{self.render_id}/"
+
+    @property
+    def video_path(self) -> str:
+        return self._scene_video_path(
+            self.media_dir, self.script_path, "SolutionAnimation"
+        )
+
+    def part_media_dir(self, index: int) -> str:
+        """The media directory of one section when rendering sections in parallel."""
+        return f"{self.media_dir}parts/{index}/"
+
+    def part_video_path(self, index: int, scene_name: str) -> str:
+        return self._scene_video_path(
+            self.part_media_dir(index), self.sections_script_path, scene_name
+        )
+
+    @staticmethod
+    def _scene_video_path(media_dir: str, script_path: str, scene_name: str) -> str:
+        # manim names the video folder after the module of the rendered script
+        module_name = os.path.splitext(os.path.basename(script_path))[0]
+        video_dir: str = os.path.abspath(f"{media_dir}videos/{module_name}")
+        return f"{video_dir}/480p10/{scene_name}.mp4"
+
+
+# The render job of the current pipeline run, set before the agents are invoked
+# so the video agent callback knows where to write and render its script.
+_current_render_job: contextvars.ContextVar[RenderJob | None] = (
+    contextvars.ContextVar("current_render_job", default=None)
+)
+
+
+def start_render_job(render_id: str | None = None) -> RenderJob:
+    """
+    Creates a render job and makes it the current one for this task.
+
+    Args:
+        render_id: str | None - The id to use, e.g. the id of the API job.
+            A random id is generated if not provided.
+
+    Returns:
+        RenderJob - The new render job.
+    """
+    render_job = RenderJob(render_id=render_id or uuid.uuid4().hex)
+    _current_render_job.set(render_job)
+    return render_job
+
+
+def find_render_job(render_id: str) -> RenderJob | None:
+    """
+    Looks up a finished render by id.
+
+    Returns:
+        RenderJob | None - The render job, or None if the id is malformed or the
+            render did not produce a video.
+    """
+    # Ids are uuid hex digests, anything else could escape the media directory
+    if not re.fullmatch(r"[0-9a-f]{32}", render_id):
+        return None
+
+    render_job = RenderJob(render_id=render_id)
+    try:
+        # Mark the render as recently used for the media eviction
+        os.utime(render_job.media_dir)
+    except FileNotFoundError:
+        return None
+    if not os.path.isfile(render_job.video_path):
+        return None
+
+    return render_job
+
+
+def discard_intermediates(render_job: RenderJob) -> None:
+    """
+    Deletes everything a render left in its media directory but the video:
+    partial movie files, section parts and their concat list.
+    """
+    video_path = os.path.abspath(render_job.video_path)
+    for root, dirs, files in os.walk(render_job.media_dir, topdown=False):
+        for name in files:
+            path = os.path.abspath(os.path.join(root, name))
+            if path != video_path:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        for name in dirs:
+            try:
+                # Only empty directories, the one holding the video stays
+                os.rmdir(os.path.join(root, name))
+            except OSError:
+                pass
+
+
+@throttled(MEDIA_PRUNE_INTERVAL_SECONDS)
+def prune_media() -> None:
+    """
+    Evicts the media directories (and scripts) of the least recently used
+    renders once they take more than `MEDIA_MAX_BYTES`. Videos served from
+    the render cache are hard links, so evicting them here is what actually
+    frees the disk space of evicted cache entries. Runs at most once every
+    `MEDIA_PRUNE_INTERVAL_SECONDS`.
+    """
+    evicted = prune_subdirectories_lru(
+        MEDIA_DUMP_DIR, MEDIA_MAX_BYTES, min_age_seconds=JOB_TTL_SECONDS
+    )
+    for render_id in evicted:
+        render_job = RenderJob(render_id=render_id)
+        for script_path in (render_job.script_path, render_job.sections_script_path):
+            try:
+                os.remove(script_path)
+            except FileNotFoundError:
+                pass
+
+    if evicted:
+        print(f"Evicted the media of {len(evicted)} renders")
+
+
+def current_render_job() -> RenderJob:
+    render_job = _current_render_job.get()
+    if render_job is None:
+        raise ValueError("No render job has been started")
+    return render_job
+
+
+_render_semaphore: asyncio.Semaphore | None = None
+
+
+def get_render_semaphore() -> asyncio.Semaphore:
+    """Returns the semaphore bounding the number of concurrent renders."""
+    global _render_semaphore
+    if _render_semaphore is None:
+        _render_semaphore = asyncio.Semaphore(RENDER_CONCURRENCY)
+    return _render_semaphore
 
 
 def parse_text_to_code(text: str) -> str:
@@ -35,32 +254,26 @@ def parse_text_to_code(text: str) -> str:
     return code
 
 
-def write_code_to_file(code: str) -> str:
+def write_code_to_file(code: str, render_job: RenderJob) -> str:
     """
-    Writes a given code block to a file in the scripts directory.
-
-    The filename will be a random 10 character string followed by '.py'.
-    The file will be written in the scripts directory.
+    Writes a given code block to the script file of a render job.
 
     Args:
         code: str - The code block to write to the file.
+        render_job: RenderJob - The render job owning the script.
 
     Returns:
-        str - The name of the file written to.
+        str - The path of the file written to.
     """
-    file_name: str = f"{random_chars()}.py"
-    file_path: str = f"{SCRIPT_DIR}{file_name}"
-
-    with open(file_path, "w", encoding="utf-8") as file:
+    with open(render_job.script_path, "w", encoding="utf-8") as file:
         file.write(code)
 
-    return file_name
+    return render_job.script_path
 
 
-def compile_code_to_video(file_name: str) -> None:
-    file_path: str = f"{SCRIPT_DIR}{file_name}"
-    video_path: str = f"{VIDEO_DIR}{file_name[:-3]}.mp4"
-
+async def _render_with_subprocess(
+    file_path: str, media_dir: str, scene_name: str
+) -> tuple[bool, str]:
     commands: list[str] = [
         "manim",
         "-q",
@@ -68,76 +281,284 @@ def compile_code_to_video(file_name: str) -> None:
         "--fps",
         "10",
         "--media_dir",
-        MEDIA_DUMP_DIR,
+        media_dir,
+        "--config_file",
+        RENDER_CONFIG_FILE,
         file_path,
-        "SolutionAnimation",
+        scene_name,
+    ]
+
+    # manim runs in its own process group under the render limits, so a
+    # runaway render can be killed along with its LaTeX and ffmpeg children
+    process = await asyncio.create_subprocess_exec(
+        *commands,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+        preexec_fn=limit_subprocess,
+    )
+
+    try:
+        _, stderr = await asyncio.wait_for(
+            process.communicate(), RENDER_TIMEOUT if RENDER_TIMEOUT > 0 else None
+        )
+    except TimeoutError:
+        kill_process_group(process.pid)
+        await process.wait()
+        return False, f"TimeoutError: {timeout_message()}"
+    except BaseException:
+        # The request was cancelled, do not leave the render running
+        kill_process_group(process.pid)
+        raise
+
+    log = stderr.decode(errors="replace")
+    if process.returncode == -signal.SIGXCPU:
+        log += f"\n{cpu_limit_message()}"
+    elif process.returncode < 0:
+        log += f"\n{killed_message(-process.returncode)}"
+
+    return process.returncode == 0, log
+
+
+async def _render_scene(
+    file_path: str, media_dir: str, scene_name: str = "SolutionAnimation"
+) -> tuple[bool, str]:
+    """Renders one scene on the configured backend, holding a render slot."""
+    async with get_render_semaphore():
+        if RENDER_BACKEND == "pool":
+            return await render_pool.render(file_path, media_dir, scene_name)
+        return await _render_with_subprocess(file_path, media_dir, scene_name)
+
+
+async def _concatenate_videos(
+    video_paths: list[str], output_path: str, list_path: str
+) -> tuple[bool, str]:
+    """Joins videos rendered with identical settings without re-encoding them."""
+    with open(list_path, "w", encoding="utf-8") as file:
+        file.writelines(f"file '{video_path}'\n" for video_path in video_paths)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    commands: list[str] = [
+        "ffmpeg",
+        "-y",
+        "-loglevel",
+        "error",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        list_path,
+        "-c",
+        "copy",
+        "-movflags",
+        "+faststart",
+        output_path,
     ]
 
-    result = subprocess.run(args=commands, capture_output=True, text=True)
+    process = await asyncio.create_subprocess_exec(
+        *commands,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+
+    if process.returncode != 0:
+        # Tagged so the failure is classified as ours, not the script's
+        return False, f"{CONCAT_FAILURE_PREFIX} {stderr.decode(errors='replace')}"
+    return True, ""
 
-    if result.returncode != 0:
-        raise Exception(f"Video Compile Failed: {result.stderr}")
 
-    print(f"{file_name} compiled successfully at {video_path}")
+async def _render_sections(
+    render_job: RenderJob, plan: SectionPlan
+) -> tuple[bool, str]:
+    """
+    Renders every section of a scene concurrently, each in its own media
+    directory, then joins the section videos into the render job's video.
+    """
+    script_path = render_job.sections_script_path
+    with open(script_path, "w", encoding="utf-8") as file:
+        file.write(plan.code)
+
+    renders = [
+        _render_scene(script_path, render_job.part_media_dir(index), name)
+        for index, name in enumerate(plan.scene_names)
+    ]
+    results = await asyncio.gather(*renders)
+    for success, log in results:
+        if not success:
+            return False, log
+
+    part_videos = [
+        render_job.part_video_path(index, name)
+        for index, name in enumerate(plan.scene_names)
+    ]
+    return await _concatenate_videos(
+        part_videos, render_job.video_path, f"{render_job.media_dir}parts.txt"
+    )
 
 
-def fetch_video(file_name: str) -> str:
+def _caused_by_split(failure: RenderError, code: str) -> bool:
     """
-    Fetch a video from the video directory and return it as a base64 encoded string.
+    Checks whether a section render failure may come from the split itself
+    rather than from the script: anything but a script failure, or an error
+    raised in the sub-scenes appended after the script's own lines.
+    """
+    if failure.category not in SCRIPT_FAILURES:
+        return True
+    return failure.line is not None and failure.line > len(code.splitlines())
 
-    Args:
-        file_name (str): The name of the video file to fetch.
+
+async def _try_render_sections(render_job: RenderJob, code: str) -> bool:
+    """
+    Renders a script section by section, if `RENDER_MODE` allows it and the
+    scene can be split without changing the video.
 
     Returns:
-        str: The base64 encoded video data.
+        bool - Whether the video was rendered, if not the scene has to be
+            rendered whole.
+
+    Raises:
+        RenderError: If a section failed because of the script itself.
     """
-    # go to the media dump directory
-    video_path: str = MEDIA_DUMP_DIR + "videos/"
+    plan = plan_sections(code) if RENDER_MODE == "sections" else None
+    if plan is None:
+        return False
 
-    # get full path
-    video_path = os.path.abspath(video_path)
+    with Timer(f"Render {len(plan.scene_names)} Sections"):
+        success, log = await _render_sections(render_job, plan)
+    if success:
+        return True
 
-    # go to the video directory
-    video_path = video_path + "/" + file_name[:-3] + "/480p10/"
+    failure = classify_failure(log, render_job.sections_script_path)
+    if not _caused_by_split(failure, code):
+        raise failure
 
-    # go to the video file
-    video_path = video_path + "SolutionAnimation.mp4"
+    print(
+        f"Section render failed ({failure.category.value}), "
+        f"rendering {render_job.render_id} whole"
+    )
+    return False
 
-    with open(video_path, "rb") as file:
-        video_data = file.read()
 
-    return base64.b64encode(video_data).decode("utf-8")
+async def compile_code_to_video(render_job: RenderJob) -> None:
+    """
+    Renders the `SolutionAnimation` scene of a render job's script.
+
+    Scripts that were rendered before with the same settings are served from
+    the render cache without invoking manim. Known defects are fixed in the
+    script before anything else. Scripts failing the static
+    validation are rejected without rendering. Otherwise, depending on
+    `RENDER_BACKEND` the scene is rendered on a warm worker of the render pool
+    or by an asyncio manim subprocess; either way the event loop stays free
+    while manim works, and at most `RENDER_CONCURRENCY` renders run at the
+    same time. LaTeX strings known from the source are compiled into the
+    shared tex cache before rendering. In the "sections" `RENDER_MODE`,
+    scenes made of independent sections are rendered one section per worker
+    and joined afterwards, falling back to a whole scene render if the split
+    (rather than the script) may have caused a failure.
 
+    Args:
+        render_job: RenderJob - The render job whose script should be rendered.
 
-def fetch_latest_code_file() -> str:
-    pattern = os.path.join(SCRIPT_DIR, "*.py")
-    files = glob.glob(pattern)
+    Raises:
+        RenderError: If the script is invalid or fails to render.
+    """
+    with open(render_job.script_path, "r", encoding="utf-8") as file:
+        code = file.read()
+
+    # Fix known defects locally instead of failing and asking the model again
+    code, fixes = autofix_script(code)
+    if fixes:
+        print(f"Auto-fixed {len(fixes)} defects in {render_job.render_id}:")
+        for fix in fixes:
+            print(f"  line {fix.line}: {fix.description} [{fix.rule}]")
+        write_code_to_file(code, render_job)
+
+    key = manim_cache.cache_key(code, RENDER_SETTINGS)
+    cached_path = manim_cache.lookup(key)
+    if cached_path is not None:
+        manim_cache.link_into_place(cached_path, render_job.video_path)
+        print(f"{render_job.render_id} served from the render cache ({key[:12]})")
+        render_job.compiled = True
+        return
+
+    # Reject broken scripts before they take a render slot
+    with Timer("Validate Script"):
+        issues = await asyncio.to_thread(validate_script, code)
+    if issues:
+        details = "\n".join(str(issue) for issue in issues)
+        raise RenderError(
+            ErrorCategory.VALIDATION,
+            f"Script Validation Failed:\n{details}",
+            line=issues[0].line,
+        )
+
+    # Compile the script's formulas into the shared tex cache in one batch
+    with Timer("Pre-compile LaTeX"):
+        try:
+            await asyncio.to_thread(precompile_tex, code)
+        except Exception as e:
+            print(f"LaTeX pre-compilation failed, the render will compile it: {e}")
+
+    if not await _try_render_sections(render_job, code):
+        success, log = await _render_scene(
+            render_job.script_path, render_job.media_dir
+        )
+        if not success:
+            raise classify_failure(log, render_job.script_path)
+
+    render_job.compiled = True
+    await asyncio.to_thread(manim_cache.store, key, render_job.video_path)
+    print(f"{render_job.render_id} compiled successfully at {render_job.video_path}")
+
+
+async def render_script(render_job: RenderJob) -> bool:
+    """
+    Renders the script of a render job, recording the outcome on the job and
+    in the render metrics instead of raising, so the failure can be recovered.
 
-    if not files:
-        raise FileNotFoundError("No code files found")
+    Args:
+        render_job: RenderJob - The render job whose script should be rendered.
 
-    latest_file = max(files, key=os.path.getmtime)
-    return str(latest_file)
+    Returns:
+        bool - Whether the video was rendered.
+    """
+    try:
+        await compile_code_to_video(render_job)
+        render_job.failure = None
+    except RenderError as e:
+        render_job.failure = e
+    except Exception as e:
+        render_job.failure = RenderError(ErrorCategory.UNKNOWN, str(e))
 
+    if render_job.failure is not None:
+        print(f"Failed to render {render_job.render_id}: {render_job.failure}")
+    render_metrics.record_render(render_job.failure)
 
-def fetech_latest_video_file() -> str:
-    pattern = os.path.join(VIDEO_DIR, "*.mp4")
-    files = glob.glob(pattern)
+    try:
+        await asyncio.to_thread(discard_intermediates, render_job)
+        await asyncio.to_thread(prune_media)
+    except OSError as e:
+        print(f"Failed to prune the render media: {e}")
 
-    if not files:
-        raise FileNotFoundError("No video files found")
+    return render_job.failure is None
 
-    latest_file = max(files, key=os.path.getmtime)
-    return str(latest_file)
 
+def fetch_video(render_job: RenderJob) -> str:
+    """
+    Fetch the video of a render job and return it as a base64 encoded string.
 
-def fetch_desired_video() -> str:
-    # get latest code file
-    code_path: str = fetch_latest_code_file()
+    Args:
+        render_job (RenderJob): The render job whose video to fetch.
 
-    # get the related video
-    try:
-        file_name: str = code_path.split("/")[-1]
-        return fetch_video(file_name)
-    except FileNotFoundError:
-        raise Exception(f"Video failed to compile: {code_path}")
+    Returns:
+        str: The base64 encoded video data.
+
+    Raises:
+        FileNotFoundError: If the render job did not produce a video.
+    """
+    with open(render_job.video_path, "rb") as file:
+        video_data = file.read()
+
+    return base64.b64encode(video_data).decode("utf-8")
@@ -0,0 +1,185 @@
+import asyncio
+import contextvars
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Awaitable, Callable
+
+MAX_CONCURRENT_JOBS = int(os.getenv("MANIM_MAX_CONCURRENT_JOBS", "4"))
+JOB_TTL_SECONDS = int(os.getenv("MANIM_JOB_TTL_SECONDS", "3600"))
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobStage(str, Enum):
+    QUEUED = "queued"
+    EXTRACTING = "extracting"
+    ORCHESTRATOR_AGENT = "orchestrator_agent"
+    MATH_AGENT = "math_agent"
+    SCRIPT_AGENT = "script_agent"
+    VIDEO_AGENT = "video_agent"
+    COMPILING = "compiling"
+    PACKAGING = "packaging"
+    DONE = "done"
+
+
+@dataclass
+class Job:
+    job_id: str
+    status: JobStatus = JobStatus.PENDING
+    stage: JobStage = JobStage.QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: Any = None
+    error: str | None = None
+    # Seconds spent in each pipeline step, e.g. {"math_agent": 12.3}
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the job metadata (everything except the result payload)."""
+        return {
+            "job_id": self.job_id,
+            "status": self.status.value,
+            "stage": self.stage.value,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "timings": self.timings,
+        }
+
+
+# The job currently being executed by this task, used by the pipeline to
+# report progress without threading the job through every call.
+_current_job: contextvars.ContextVar[Job | None] = contextvars.ContextVar(
+    "current_job", default=None
+)
+
+
+def current_job() -> Job | None:
+    return _current_job.get()
+
+
+def set_stage(stage: JobStage | str) -> None:
+    """
+    Record the pipeline stage of the job running in the current task.
+
+    Unknown stage names (e.g. agents without a dedicated stage) and calls
+    made outside of a job are ignored.
+    """
+    job = _current_job.get()
+    if job is None:
+        return
+
+    try:
+        job.stage = JobStage(stage)
+    except ValueError:
+        return
+
+
+def record_timing(step: str, seconds: float) -> None:
+    """
+    Record how long a pipeline step of the job running in the current task
+    took, adding up steps that run several times. Calls made outside of a job
+    are ignored.
+    """
+    job = _current_job.get()
+    if job is None:
+        return
+
+    job.timings[step] = round(job.timings.get(step, 0) + seconds, 3)
+
+
+class JobManager:
+    """
+    Runs long running coroutines in the background and tracks their progress.
+
+    Jobs are executed on the event loop of the server, at most
+    `max_concurrent` at a time; the rest wait in the `pending` state.
+    Finished jobs are kept for `ttl` seconds so their result can be collected.
+    """
+
+    def __init__(
+        self, max_concurrent: int = MAX_CONCURRENT_JOBS, ttl: int = JOB_TTL_SECONDS
+    ):
+        self.max_concurrent = max_concurrent
+        self.ttl = ttl
+        self._jobs: dict[str, Job] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def submit(self, func: Callable[..., Awaitable[Any]], *args: Any) -> Job:
+        """
+        Schedule `func(*args)` as a new job and return it immediately.
+
+        Must be called from within a running event loop.
+        """
+        self.prune()
+
+        job = Job(job_id=uuid.uuid4().hex)
+        self._jobs[job.job_id] = job
+
+        task = asyncio.get_running_loop().create_task(self._run(job, func, args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def prune(self) -> None:
+        """Forget finished jobs older than the TTL."""
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished and (job.finished_at or 0) < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _run(
+        self, job: Job, func: Callable[..., Awaitable[Any]], args: tuple
+    ) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        async with self._semaphore:
+            _current_job.set(job)
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+            print(f"Job {job.job_id} started")
+
+            try:
+                job.result = await func(*args)
+                job.status = JobStatus.SUCCEEDED
+                job.stage = JobStage.DONE
+            except Exception as e:
+                print(f"Job {job.job_id} failed: {e}")
+                job.error = str(e)
+                job.status = JobStatus.FAILED
+            except asyncio.CancelledError:
+                # Still reported as finished, so the job is pruned like any other
+                print(f"Job {job.job_id} was cancelled")
+                job.error = "Job was cancelled"
+                job.status = JobStatus.FAILED
+                raise
+            finally:
+                job.finished_at = time.time()
+                print(f"Job {job.job_id} finished with status {job.status.value}")
+
+
+job_manager = JobManager()
@@ -0,0 +1,204 @@
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from manim_sandbox import (
+    KILL_GRACE_SECONDS,
+    RENDER_TIMEOUT,
+    limit_memory,
+    render_limits,
+    timeout_message,
+)
+from manim_tex import RENDER_TEX_CONFIG
+from manim_utils import Timer
+
+# Number of long lived render workers, each one renders a single scene at a time
+POOL_SIZE = int(os.getenv("MANIM_POOL_SIZE", str(os.cpu_count() or 1)))
+
+# Workers are replaced after this many renders to bound memory growth
+POOL_MAX_RENDERS = int(os.getenv("MANIM_POOL_MAX_RENDERS", "20"))
+
+
+def _init_worker() -> None:
+    """Imports manim once per worker so renders skip the startup cost."""
+    import manim  # noqa: F401
+
+    limit_memory()
+
+
+def _warm_worker() -> int:
+    return os.getpid()
+
+
+def render_scene(
+    file_path: str,
+    media_dir: str,
+    scene_name: str = "SolutionAnimation",
+    quality: str = "low_quality",
+    fps: int = 10,
+) -> tuple[bool, str]:
+    """
+    Renders a scene from a script file inside the current (worker) process.
+
+    Mirrors `manim -q l --fps 10 --media_dir <media_dir> <file_path> <scene_name>`,
+    so the video ends up at the same path the CLI would write it to. The render
+    is stopped when it exceeds its time or CPU limit.
+
+    Args:
+        file_path: str - The path of the script defining the scene.
+        media_dir: str - The manim media directory to write to.
+        scene_name: str - The name of the scene class to render.
+        quality: str - The manim quality preset.
+        fps: int - The frame rate of the video.
+
+    Returns:
+        tuple[bool, str] - Whether the render succeeded, and the error log if not.
+    """
+    from manim import tempconfig
+
+    module_name = os.path.splitext(os.path.basename(file_path))[0]
+
+    try:
+        with render_limits():
+            spec = importlib.util.spec_from_file_location(module_name, file_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            scene_class = getattr(module, scene_name)
+
+            # Order matters: the quality preset resets the frame rate
+            render_config = {
+                "quality": quality,
+                "frame_rate": fps,
+                "media_dir": media_dir,
+                "input_file": file_path,
+                "scene_names": [scene_name],
+                **RENDER_TEX_CONFIG,
+            }
+            with tempconfig(render_config):
+                scene_class().render()
+    except Exception:
+        return False, traceback.format_exc()
+
+    return True, ""
+
+
+class RenderPool:
+    """
+    A pool of pre-forked worker processes that render manim scenes in-process.
+
+    Workers are forked from a forkserver that has already imported manim, and
+    are recycled after `max_renders` renders. Each worker enforces the render
+    limits itself; a worker that fails to stop a render in time is killed.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_renders: int = POOL_MAX_RENDERS):
+        self.size = size
+        self.max_renders = max_renders
+        self._executor: ProcessPoolExecutor | None = None
+        # One slot per worker, see render()
+        self._slots: asyncio.Semaphore | None = None
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # Recycling workers is not supported with the plain fork start method
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["manim"])
+
+        return ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=context,
+            initializer=_init_worker,
+            max_tasks_per_child=self.max_renders,
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = self._create_executor()
+        return self._executor
+
+    async def start(self) -> None:
+        """Forks every worker up front so the first renders start warm."""
+        with Timer(f"Start Render Pool ({self.size} workers)"):
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            warmups = [
+                loop.run_in_executor(executor, _warm_worker) for _ in range(self.size)
+            ]
+            await asyncio.gather(*warmups)
+
+    async def render(
+        self, file_path: str, media_dir: str, scene_name: str = "SolutionAnimation"
+    ) -> tuple[bool, str]:
+        """
+        Renders a scene of a script on a pool worker.
+
+        Renders wait here for a free worker rather than in the executor's
+        queue, so the render timeout only counts the time spent rendering,
+        however many renders are submitted at once.
+
+        Returns:
+            tuple[bool, str] - Whether the render succeeded, and the error log if not.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._slots:
+            return await self._render(file_path, media_dir, scene_name)
+
+    async def _render(
+        self, file_path: str, media_dir: str, scene_name: str
+    ) -> tuple[bool, str]:
+        loop = asyncio.get_running_loop()
+        # Failures only ever retire the pool the render was submitted to, by
+        # then another render may already have replaced it
+        executor = self._get_executor()
+        render = loop.run_in_executor(
+            executor, render_scene, file_path, media_dir, scene_name
+        )
+
+        try:
+            if RENDER_TIMEOUT <= 0:
+                return await render
+            return await asyncio.wait_for(render, RENDER_TIMEOUT + KILL_GRACE_SECONDS)
+        except TimeoutError:
+            # The worker did not stop the render itself (e.g. stuck in native
+            # code). Workers cannot be killed one by one, so the pool is
+            # replaced; renders on other workers fail as crashed and are retried
+            self.terminate(executor)
+            return False, f"TimeoutError: {timeout_message()}, render pool restarted"
+        except BrokenProcessPool:
+            # A worker died mid render (e.g. killed by the OS), start over
+            self.shutdown(executor)
+            return False, f"Render worker crashed:\n{traceback.format_exc()}"
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise
+            # The render was still queued when its pool was restarted
+            return False, "Render worker crashed: the render pool was restarted"
+
+    def terminate(self, executor: ProcessPoolExecutor | None = None) -> None:
+        """
+        Kills every worker of `executor` (the current pool by default) right
+        away, the next render starts a new pool.
+        """
+        executor = executor or self._executor
+        # Cleared once the pool has been shut down (e.g. by a concurrent timeout)
+        if executor is not None and executor._processes:
+            for process in list(executor._processes.values()):
+                process.kill()
+        self.shutdown(executor)
+
+    def shutdown(self, executor: ProcessPoolExecutor | None = None) -> None:
+        """Shuts down `executor` (the current pool by default)."""
+        executor = executor or self._executor
+        if executor is None:
+            return
+
+        executor.shutdown(wait=False, cancel_futures=True)
+        if executor is self._executor:
+            self._executor = None
+
+
+render_pool = RenderPool()
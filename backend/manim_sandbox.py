@@ -0,0 +1,103 @@
+import os
+import resource
+import signal
+from contextlib import contextmanager
+from typing import Iterator
+
+# Wall-clock seconds a single render may take before it is stopped (0 disables)
+RENDER_TIMEOUT = int(os.getenv("MANIM_RENDER_TIMEOUT", "300"))
+
+# CPU seconds a single render may use (0 disables)
+RENDER_CPU_SECONDS = int(os.getenv("MANIM_RENDER_CPU_SECONDS", "600"))
+
+# Address space of a render process in megabytes (0 disables). manim maps a
+# lot of memory it never touches, keep this well above the resident size.
+RENDER_MEMORY_MB = int(os.getenv("MANIM_RENDER_MEMORY_MB", "4096"))
+
+# Extra seconds granted after the timeout before a stuck render is killed
+KILL_GRACE_SECONDS = 10
+
+
+class RenderLimitError(Exception):
+    """A render exceeded its CPU or memory limit."""
+
+
+def timeout_message() -> str:
+    return f"Render timed out after {RENDER_TIMEOUT}s"
+
+
+def cpu_limit_message() -> str:
+    return f"Render exceeded its CPU time limit of {RENDER_CPU_SECONDS}s"
+
+
+def killed_message(signal_number: int) -> str:
+    return f"Render killed by signal {signal_number}"
+
+
+def _set_soft_limit(limit: int, value: int) -> None:
+    # Only the soft limit is lowered, so a pool worker can raise it again
+    _, hard = resource.getrlimit(limit)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    resource.setrlimit(limit, (value, hard))
+
+
+def limit_memory() -> None:
+    """Caps the address space of the current process at `RENDER_MEMORY_MB`."""
+    if RENDER_MEMORY_MB > 0:
+        _set_soft_limit(resource.RLIMIT_AS, RENDER_MEMORY_MB * 1024 * 1024)
+
+
+def limit_subprocess() -> None:
+    """
+    Applies the render limits to a manim subprocess, run between fork and
+    exec. The wall-clock timeout is enforced by the parent, which kills the
+    process group of the render (manim and its LaTeX/ffmpeg children).
+    """
+    limit_memory()
+    if RENDER_CPU_SECONDS > 0:
+        # Exceeding the CPU limit kills the process with SIGXCPU
+        _set_soft_limit(resource.RLIMIT_CPU, RENDER_CPU_SECONDS)
+
+
+def kill_process_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError(timeout_message())
+
+
+def _raise_cpu_limit(signum, frame):
+    raise RenderLimitError(cpu_limit_message())
+
+
+@contextmanager
+def render_limits() -> Iterator[None]:
+    """
+    Enforces the wall-clock and CPU limits on a render running in the current
+    (pool worker) process, raising `TimeoutError` or `RenderLimitError` in the
+    middle of the render when one is exceeded. Workers render many scenes, so
+    the CPU limit counts from the CPU time already used when the render starts.
+    Must be used from the main thread.
+    """
+    previous_alarm = signal.signal(signal.SIGALRM, _raise_timeout)
+    previous_xcpu = signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+    cpu_limit, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+
+    try:
+        if RENDER_TIMEOUT > 0:
+            signal.setitimer(signal.ITIMER_REAL, RENDER_TIMEOUT)
+        if RENDER_CPU_SECONDS > 0:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            used = int(usage.ru_utime + usage.ru_stime)
+            _set_soft_limit(resource.RLIMIT_CPU, used + RENDER_CPU_SECONDS)
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_hard))
+        signal.signal(signal.SIGALRM, previous_alarm)
+        signal.signal(signal.SIGXCPU, previous_xcpu)
@@ -0,0 +1,381 @@
+import ast
+from dataclasses import dataclass
+
+# Animations that take their mobjects off the screen
+CLEARING_ANIMATIONS = {"FadeOut", "Uncreate", "Unwrite", "ShrinkToCenter"}
+
+# Animations of several mobjects, every other animation only puts its first
+# argument on screen (the others are paths, angles, colors...)
+MULTI_MOBJECT_ANIMATIONS = {"FadeIn", "FadeOut"}
+
+# Transforms morphing their first mobject into the shape of the second one,
+# which never appears on screen itself
+MORPHING_TRANSFORMS = {"Transform", "ClockwiseTransform", "CounterclockwiseTransform"}
+
+# Transforms replacing their first mobject on screen with the second one
+REPLACING_TRANSFORMS = {
+    "ReplacementTransform",
+    "TransformMatchingTex",
+    "TransformMatchingShapes",
+    "FadeTransform",
+    "FadeTransformPieces",
+}
+
+# Transforms adding the second mobject, morphed from a copy of the first one
+COPYING_TRANSFORMS = {"TransformFromCopy"}
+
+TRANSFORMS = MORPHING_TRANSFORMS | REPLACING_TRANSFORMS | COPYING_TRANSFORMS
+
+# Animations highlighting mobjects already on screen, leaving nothing behind
+INDICATIONS = {
+    "Indicate",
+    "Circumscribe",
+    "Flash",
+    "Wiggle",
+    "FocusOn",
+    "ShowPassingFlash",
+    "ApplyWave",
+}
+
+# Animations playing the animations passed to them
+ANIMATION_GROUPS = {"AnimationGroup", "LaggedStart", "Succession"}
+
+# Scene methods putting their arguments on screen
+ADDING_METHODS = {"add", "bring_to_front", "bring_to_back", "add_foreground_mobjects"}
+
+# Mobjects grouping others, `FadeOut(VGroup(a, b))` removes both `a` and `b`
+GROUP_CLASSES = {"VGroup", "Group"}
+
+# Stands for mobjects without a name (e.g. `Create(Circle())`), which only
+# `self.clear()` or `FadeOut(*self.mobjects)` are known to take off the screen
+UNTRACKED = "<untracked>"
+
+
+@dataclass
+class SectionPlan:
+    """A scene split into independently renderable sub-scenes."""
+
+    code: str
+    scene_names: list[str]
+
+
+def _self_call_name(statement: ast.stmt) -> str | None:
+    """Returns `name` for a `self.name(...)` expression statement."""
+    if not (isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Call)):
+        return None
+
+    func = statement.value.func
+    if (
+        isinstance(func, ast.Attribute)
+        and isinstance(func.value, ast.Name)
+        and func.value.id == "self"
+    ):
+        return func.attr
+
+    return None
+
+
+def _root_name(node: ast.expr) -> str | None:
+    """Returns `a` for `a`, `a.b`, `a[0]` or `a.animate.shift(UP)`."""
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _is_all_mobjects(node: ast.expr) -> bool:
+    """Checks for `*self.mobjects`."""
+    return (
+        isinstance(node, ast.Starred)
+        and isinstance(node.value, ast.Attribute)
+        and node.value.attr == "mobjects"
+        and isinstance(node.value.value, ast.Name)
+        and node.value.value.id == "self"
+    )
+
+
+def _mobject_names(nodes: list[ast.expr]) -> set[str]:
+    """
+    The names of the mobjects passed to an animation or to `add()`/`remove()`,
+    looking into `VGroup(...)`. Mobjects created inline (`Circle()`,
+    `a.copy()`) or unpacked from a list are `UNTRACKED`.
+    """
+    names: set[str] = set()
+    for node in nodes:
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in GROUP_CLASSES
+        ):
+            names |= _mobject_names(node.args)
+            continue
+
+        name = None if isinstance(node, ast.Call) else _root_name(node)
+        names.add(name or UNTRACKED)
+
+    return names
+
+
+def _calls_self(statement: ast.stmt) -> bool:
+    """Checks whether a statement calls a scene method other than `wait()`."""
+    return any(
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and isinstance(node.func.value, ast.Name)
+        and node.func.value.id == "self"
+        and node.func.attr != "wait"
+        for node in ast.walk(statement)
+    )
+
+
+def _take_off_screen(on_screen: set[str], names: set[str]) -> set[str]:
+    # Removing an untracked mobject does not tell which one left the screen
+    return on_screen - (names - {UNTRACKED})
+
+
+def _animated_names(animation: ast.Call) -> set[str]:
+    """The mobjects of `a.animate.shift(UP)` or `VGroup(a, b).animate.scale(2)`."""
+    node = animation.func
+    while isinstance(node, (ast.Attribute, ast.Call)):
+        if isinstance(node, ast.Attribute) and node.attr == "animate":
+            return _mobject_names([node.value])
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return {UNTRACKED}
+
+
+def _animate(on_screen: set[str], animation: ast.expr) -> set[str] | None:
+    """The mobjects on screen after an animation, None if unknown."""
+    if not isinstance(animation, ast.Call):
+        return None  # an animation built elsewhere
+    if isinstance(animation.func, ast.Attribute):
+        # `.animate` animates (and may add) its mobject itself
+        return on_screen | _animated_names(animation)
+
+    name = animation.func.id if isinstance(animation.func, ast.Name) else None
+    args = animation.args
+    mobjects = args if name in MULTI_MOBJECT_ANIMATIONS else args[:1]
+
+    if name in ANIMATION_GROUPS:
+        return _play(on_screen, args)
+    if name in INDICATIONS:
+        return on_screen
+    if name in CLEARING_ANIMATIONS:
+        if any(map(_is_all_mobjects, args)):
+            return set()
+        return _take_off_screen(on_screen, _mobject_names(mobjects))
+    if name in TRANSFORMS and len(args) >= 2:
+        return _transform(on_screen, name, args[0], args[1])
+
+    return on_screen | _mobject_names(mobjects)
+
+
+def _transform(
+    on_screen: set[str], name: str, source: ast.expr, target: ast.expr
+) -> set[str]:
+    """The mobjects on screen after a transform of `source` into `target`."""
+    source_names, target_names = _mobject_names([source]), _mobject_names([target])
+    if name in MORPHING_TRANSFORMS:
+        return on_screen | source_names
+    if name in REPLACING_TRANSFORMS:
+        return _take_off_screen(on_screen, source_names) | target_names
+    return on_screen | target_names
+
+
+def _play(on_screen: set[str], animations: list[ast.expr]) -> set[str] | None:
+    """The mobjects on screen after `self.play(*animations)`, None if unknown."""
+    for animation in animations:
+        on_screen = _animate(on_screen, animation)
+        if on_screen is None:
+            return None
+    return on_screen
+
+
+def _clears_screen(method: ast.FunctionDef) -> bool:
+    """
+    Checks whether a section ends with an empty screen, so the next section
+    can start from a fresh scene without changing the video.
+
+    The mobjects put on screen by the section are tracked statement by
+    statement: the screen is empty after `self.clear()`, after
+    `FadeOut(*self.mobjects)` (or `self.remove(*self.mobjects)`), or when every
+    named mobject added was faded out or removed again. Anything that cannot
+    be tracked (animations stored in variables, screen changes in loops or
+    helper methods) counts as not clearing.
+    """
+    on_screen: set[str] | None = set()
+
+    for statement in method.body:
+        name = _self_call_name(statement)
+        if name is None:
+            # Screen changes nested in loops, conditions... cannot be tracked
+            if _calls_self(statement):
+                return False
+            continue
+
+        args = statement.value.args
+        if name == "clear" or (name == "remove" and any(map(_is_all_mobjects, args))):
+            on_screen = set()
+        elif name in ADDING_METHODS:
+            on_screen = on_screen | _mobject_names(args)
+        elif name == "remove":
+            on_screen = _take_off_screen(on_screen, _mobject_names(args))
+        elif name == "play":
+            on_screen = _play(on_screen, args)
+        elif name != "wait":
+            return False  # helper methods may add anything to the screen
+
+        if on_screen is None:
+            return False
+
+    return not on_screen
+
+
+def _shares_state(methods: dict[str, ast.FunctionDef]) -> bool:
+    """
+    Checks whether methods communicate through instance attributes or mutate
+    the camera, either of which would make sections depend on each other.
+    """
+    stored: dict[str, set[str]] = {}
+    loaded: dict[str, set[str]] = {}
+
+    for method_name, method in methods.items():
+        for node in ast.walk(method):
+            if not isinstance(node, ast.Attribute):
+                continue
+
+            # self.camera.background_color = ... carries over to later sections
+            inner = node.value
+            if (
+                isinstance(node.ctx, ast.Store)
+                and isinstance(inner, ast.Attribute)
+                and isinstance(inner.value, ast.Name)
+                and inner.value.id == "self"
+            ):
+                return True
+
+            if not (isinstance(node.value, ast.Name) and node.value.id == "self"):
+                continue
+
+            target = stored if isinstance(node.ctx, ast.Store) else loaded
+            target.setdefault(node.attr, set()).add(method_name)
+
+    for attr, storing_methods in stored.items():
+        if loaded.get(attr, set()) - storing_methods:
+            return True
+
+    return False
+
+
+def _group_sections(
+    construct: ast.FunctionDef, methods: dict[str, ast.FunctionDef]
+) -> list[tuple[str, list[ast.stmt]]] | None:
+    """
+    Groups the statements of `construct()` by the section method they call,
+    attaching waits to the preceding section. Returns None if `construct()`
+    does anything but call section methods and wait.
+    """
+    sections: list[tuple[str, list[ast.stmt]]] = []
+    leading: list[ast.stmt] = []
+
+    for statement in construct.body:
+        if isinstance(statement, ast.Expr) and isinstance(
+            statement.value, ast.Constant
+        ):
+            continue  # docstring
+
+        name = _self_call_name(statement)
+        if name == "wait":
+            (sections[-1][1] if sections else leading).append(statement)
+        elif name in methods and not (statement.value.args or statement.value.keywords):
+            sections.append((name, [*leading, statement]))
+            leading = []
+        else:
+            return None
+
+    return sections
+
+
+def _split_parts(
+    sections: list[tuple[str, list[ast.stmt]]], methods: dict[str, ast.FunctionDef]
+) -> list[list[ast.stmt]]:
+    """
+    Groups consecutive sections into parts, starting a new part after every
+    section that clears the screen. Sections leaving mobjects behind stay in
+    the same part as the sections after them.
+    """
+    parts: list[list[ast.stmt]] = [[]]
+    for index, (name, statements) in enumerate(sections):
+        parts[-1].extend(statements)
+        if index < len(sections) - 1 and _clears_screen(methods[name]):
+            parts.append([])
+    return parts
+
+
+def plan_sections(
+    code: str, scene_name: str = "SolutionAnimation"
+) -> SectionPlan | None:
+    """
+    Splits a scene whose `construct()` only calls section methods into
+    sub-scenes, one per run of sections ending on an empty screen.
+
+    The split is only planned where it cannot change the video: a part only
+    ends after a section that clears the screen, and sections do not share
+    instance state. The original scene is left untouched, the sub-scenes are
+    appended to the script as subclasses calling the sections of their part.
+
+    Args:
+        code: str - The source code of the script.
+        scene_name: str - The name of the scene class to split.
+
+    Returns:
+        SectionPlan | None - The script with the sub-scenes and their names in
+            playback order, or None if the scene cannot be split safely.
+    """
+    try:
+        module = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    classes = {
+        node.name: node for node in module.body if isinstance(node, ast.ClassDef)
+    }
+    if scene_name not in classes:
+        return None
+
+    methods = {
+        node.name: node
+        for node in classes[scene_name].body
+        if isinstance(node, ast.FunctionDef)
+    }
+    construct = methods.pop("construct", None)
+    if construct is None:
+        return None
+
+    sections = _group_sections(construct, methods)
+    if sections is None or len(sections) < 2:
+        return None
+
+    section_names = [name for name, _ in sections]
+    if len(set(section_names)) != len(section_names) or _shares_state(methods):
+        return None
+
+    parts = _split_parts(sections, methods)
+    if len(parts) < 2:
+        return None
+
+    scene_names = [f"{scene_name}Part{index}" for index in range(1, len(parts) + 1)]
+    if any(name in classes for name in scene_names):
+        return None
+
+    sub_scenes: list[str] = []
+    for sub_scene_name, statements in zip(scene_names, parts, strict=True):
+        body = "\n".join(f"        {ast.unparse(s)}" for s in statements)
+        sub_scenes.append(
+            f"class {sub_scene_name}({scene_name}):\n"
+            f"    def construct(self):\n"
+            f"{body}\n"
+        )
+
+    return SectionPlan(
+        code=f"{code.rstrip()}\n\n\n" + "\n\n".join(sub_scenes),
+        scene_names=scene_names,
+    )
@@ -0,0 +1,342 @@
+import ast
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from manim_sandbox import RENDER_TIMEOUT
+from manim_utils import atomic_write, prune_directory_lru, throttled
+
+# Shared, persistent LaTeX cache read by every render. Point it at shared
+# storage to compile each formula once for all API nodes.
+TEX_DIR = os.path.abspath(os.getenv("MANIM_TEX_DIR", "./manim/tex/"))
+
+# manim config pointing the CLI renders at the shared cache. It holds the
+# absolute path of this machine's cache, so it is generated outside of the
+# source tree, under a name derived from that path.
+RENDER_CONFIG_FILE = os.path.join(
+    tempfile.gettempdir(),
+    f"teachme-manim-{hashlib.sha256(TEX_DIR.encode()).hexdigest()[:12]}.cfg",
+)
+
+# Number of LaTeX compilations running at the same time during pre-compilation
+TEX_CONCURRENCY = int(
+    os.getenv("MANIM_TEX_CONCURRENCY", str(os.cpu_count() or 1))
+)
+
+# Size of the shared LaTeX cache, the least recently used SVGs are evicted
+TEX_MAX_BYTES = int(os.getenv("MANIM_TEX_MAX_BYTES", str(512 * 1024**2)))
+
+# Seconds a single LaTeX or dvisvgm run may take during pre-compilation, a
+# formula that runs longer is left to the render and its own time limit
+TEX_COMPILE_TIMEOUT = min(60, RENDER_TIMEOUT) if RENDER_TIMEOUT > 0 else 60
+
+# Intermediate files renders leave in the shared cache, see RENDER_TEX_CONFIG.
+# They are kept for an hour so failed renders can still report the LaTeX log.
+TEX_INTERMEDIATE_SUFFIXES = (".aux", ".log", ".dvi", ".xdv", ".pdf")
+TEX_INTERMEDIATE_MAX_AGE_SECONDS = 3600
+
+# Minimum seconds between two clean-ups of the shared LaTeX cache
+TEX_PRUNE_INTERVAL_SECONDS = 600
+
+# Mobjects compiled through LaTeX, with their default separator and environment
+TEX_CLASSES: dict[str, tuple[str, str]] = {
+    "MathTex": (" ", "align*"),
+    "Tex": ("", "center"),
+}
+
+# manim deletes the intermediate files of the whole tex directory after each
+# compilation, which would race with other renders sharing the directory
+RENDER_TEX_CONFIG: dict = {
+    "tex_dir": TEX_DIR,
+    "no_latex_cleanup": True,
+}
+
+# manim's config is global, pre-compilations of concurrent jobs take turns
+_config_lock = threading.Lock()
+
+os.makedirs(TEX_DIR, exist_ok=True)
+
+
+def _write_render_config() -> None:
+    # Concurrent renders never read a partially written config
+    with atomic_write(RENDER_CONFIG_FILE) as temp_path:
+        with open(temp_path, "w", encoding="utf-8") as config_file:
+            config_file.write(
+                f"[CLI]\ntex_dir = {TEX_DIR}\nno_latex_cleanup = True\n"
+            )
+
+
+_write_render_config()
+
+
+@dataclass
+class TexCall:
+    """A `MathTex(...)`/`Tex(...)` call whose LaTeX is known before rendering."""
+
+    class_name: str
+    tex_strings: list[str]
+    arg_separator: str
+    tex_environment: str
+    substrings_to_isolate: list[str] = field(default_factory=list)
+    colored_substrings: list[str] = field(default_factory=list)
+
+
+def _literal_strings(node: ast.expr) -> list[str] | None:
+    """Returns the strings of a literal list/tuple of strings, None otherwise."""
+    if not isinstance(node, (ast.List, ast.Tuple)):
+        return None
+    if not all(
+        isinstance(item, ast.Constant) and isinstance(item.value, str)
+        for item in node.elts
+    ):
+        return None
+    return [item.value for item in node.elts]
+
+
+def _apply_keyword(tex_call: TexCall, keyword: ast.keyword) -> bool:
+    """Applies a keyword argument to a call, False if it is not a literal."""
+    value = keyword.value
+    if keyword.arg == "tex_template" or keyword.arg is None:
+        # Custom templates and **kwargs cannot be resolved statically
+        return False
+
+    if keyword.arg in ("arg_separator", "tex_environment"):
+        if not (isinstance(value, ast.Constant) and isinstance(value.value, str)):
+            return False
+        setattr(tex_call, keyword.arg, value.value)
+    elif keyword.arg == "substrings_to_isolate":
+        substrings = _literal_strings(value)
+        if substrings is None:
+            return False
+        tex_call.substrings_to_isolate = substrings
+    elif keyword.arg == "tex_to_color_map":
+        # Only the keys change the LaTeX, the colors are applied afterwards
+        if not isinstance(value, ast.Dict):
+            return False
+        substrings = _literal_strings(ast.List(elts=value.keys, ctx=ast.Load()))
+        if substrings is None:
+            return False
+        tex_call.colored_substrings = substrings
+
+    return True
+
+
+def _parse_tex_call(node: ast.Call) -> TexCall | None:
+    if not (isinstance(node.func, ast.Name) and node.func.id in TEX_CLASSES):
+        return None
+
+    if not node.args or not all(
+        isinstance(arg, ast.Constant) and isinstance(arg.value, str)
+        for arg in node.args
+    ):
+        return None
+
+    arg_separator, tex_environment = TEX_CLASSES[node.func.id]
+    tex_call = TexCall(
+        class_name=node.func.id,
+        tex_strings=[arg.value for arg in node.args],
+        arg_separator=arg_separator,
+        tex_environment=tex_environment,
+    )
+
+    if not all(_apply_keyword(tex_call, keyword) for keyword in node.keywords):
+        return None
+
+    return tex_call
+
+
+def extract_tex_calls(code: str) -> list[TexCall]:
+    """
+    Finds the `MathTex`/`Tex` calls of a script whose arguments are literals.
+
+    Args:
+        code: str - The source code of the script.
+
+    Returns:
+        list[TexCall] - The statically known LaTeX calls, in source order.
+    """
+    try:
+        module = ast.parse(code)
+    except SyntaxError:
+        return []
+
+    tex_calls = []
+    for node in ast.walk(module):
+        if isinstance(node, ast.Call):
+            tex_call = _parse_tex_call(node)
+            if tex_call is not None:
+                tex_calls.append(tex_call)
+
+    return tex_calls
+
+
+def _expression_of(tex_call: TexCall) -> str:
+    """
+    Reproduces the exact LaTeX expression manim compiles for a call, so the
+    pre-compiled SVG lands under the file name manim will look up.
+    """
+    from manim import MathTex
+
+    # Only the string processing helpers are used, no LaTeX is compiled here
+    mobject = MathTex.__new__(MathTex)
+    mobject.substrings_to_isolate = tex_call.substrings_to_isolate
+    mobject.tex_to_color_map = dict.fromkeys(tex_call.colored_substrings)
+
+    tex_strings = mobject._break_up_tex_strings(tex_call.tex_strings)
+    tex_string = tex_call.arg_separator.join(tex_strings)
+    return mobject._get_modified_expression(tex_string)
+
+
+def _compile_to_svg(tex_file: str, tex_compiler: str, output_format: str) -> None:
+    """
+    Compiles one tex file in a private directory and atomically moves the SVG
+    next to it, so concurrent renders never see a partially written SVG.
+    """
+    name = os.path.splitext(os.path.basename(tex_file))[0]
+    svg_path = os.path.join(os.path.dirname(tex_file), f"{name}.svg")
+
+    with tempfile.TemporaryDirectory(dir=TEX_DIR, prefix=".compile-") as work_dir:
+        work_tex = os.path.join(work_dir, f"{name}.tex")
+        shutil.copyfile(tex_file, work_tex)
+
+        compile_command = [
+            tex_compiler,
+            "-interaction=batchmode",
+            "-halt-on-error",
+            f"-output-directory={work_dir}",
+            work_tex,
+        ]
+        if tex_compiler in ("xelatex", "xetex"):
+            compile_command.insert(1, "-no-pdf")
+        else:
+            compile_command.insert(1, f"-output-format={output_format[1:]}")
+        subprocess.run(
+            compile_command,
+            check=True,
+            capture_output=True,
+            timeout=TEX_COMPILE_TIMEOUT,
+        )
+
+        work_svg = os.path.join(work_dir, f"{name}.svg")
+        convert_command = [
+            "dvisvgm",
+            *(["--pdf"] if output_format == ".pdf" else []),
+            "--page=1",
+            "--no-fonts",
+            "--verbosity=0",
+            f"--output={work_svg}",
+            os.path.join(work_dir, f"{name}{output_format}"),
+        ]
+        subprocess.run(
+            convert_command,
+            check=True,
+            capture_output=True,
+            timeout=TEX_COMPILE_TIMEOUT,
+        )
+
+        os.replace(work_svg, svg_path)
+
+
+@throttled(TEX_PRUNE_INTERVAL_SECONDS)
+def prune_tex_cache() -> None:
+    """
+    Bounds the shared LaTeX cache. Renders compile with `no_latex_cleanup`, so
+    their intermediate files are deleted here once they are old enough, then
+    the least recently used SVGs are evicted until the cache fits in
+    `TEX_MAX_BYTES`. Runs at most once every `TEX_PRUNE_INTERVAL_SECONDS`.
+    """
+    cutoff = time.time() - TEX_INTERMEDIATE_MAX_AGE_SECONDS
+    try:
+        for entry in os.scandir(TEX_DIR):
+            if (
+                entry.name.endswith(TEX_INTERMEDIATE_SUFFIXES)
+                and entry.is_file()
+                and entry.stat().st_mtime < cutoff
+            ):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+        prune_directory_lru(TEX_DIR, TEX_MAX_BYTES)
+    except OSError as e:
+        print(f"Failed to prune the LaTeX cache: {e}")
+
+
+def precompile_tex(code: str) -> int:
+    """
+    Compiles every statically known LaTeX string of a script into the shared
+    tex cache before the script is rendered.
+
+    Strings already in the cache are skipped and the missing ones are compiled
+    as one batch, `TEX_CONCURRENCY` at a time, instead of one after the other
+    in the middle of the render. Strings that fail to compile are left to the
+    render, which reports the LaTeX error as usual.
+
+    Args:
+        code: str - The source code of the script.
+
+    Returns:
+        int - The number of strings compiled.
+    """
+    tex_calls = extract_tex_calls(code)
+    if not tex_calls:
+        return 0
+
+    from manim.utils.tex_file_writing import generate_tex_file
+
+    from manim import config, tempconfig
+
+    # Let manim write the tex files itself so their names match its lookups
+    missing: dict[str, None] = {}
+    with _config_lock, tempconfig({"tex_dir": TEX_DIR}):
+        tex_template = config.tex_template
+        for tex_call in tex_calls:
+            try:
+                expression = _expression_of(tex_call)
+                tex_file = str(
+                    generate_tex_file(
+                        expression, tex_call.tex_environment, tex_template
+                    )
+                )
+            except Exception as e:
+                print(f"Skipping pre-compilation of {tex_call.tex_strings}: {e}")
+                continue
+
+            svg_file = os.path.splitext(tex_file)[0] + ".svg"
+            try:
+                # Mark cached SVGs as used so the LRU clean-up keeps them
+                os.utime(svg_file)
+            except FileNotFoundError:
+                missing[tex_file] = None
+
+    def compile_one(tex_file: str) -> bool:
+        try:
+            _compile_to_svg(
+                tex_file, tex_template.tex_compiler, tex_template.output_format
+            )
+            return True
+        except (
+            OSError,
+            subprocess.CalledProcessError,
+            subprocess.TimeoutExpired,
+        ) as e:
+            print(f"Failed to pre-compile {tex_file}: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=TEX_CONCURRENCY) as executor:
+        compiled = sum(executor.map(compile_one, missing))
+
+    prune_tex_cache()
+
+    print(
+        f"Pre-compiled {compiled} of {len(missing)} new LaTeX strings "
+        f"({len(tex_calls)} found in script)"
+    )
+    return compiled
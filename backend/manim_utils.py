@@ -1,5 +1,18 @@
+import functools
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
 from time import perf_counter
+from typing import TYPE_CHECKING, Callable, Iterator, TypeVar
+
+if TYPE_CHECKING:
+    from google.adk.events import Event
+
+T = TypeVar("T")
 
 
 class Timer:
@@ -26,6 +39,164 @@ class Timer:
         )
 
 
+def event_text(event: "Event") -> str:
+    """Concatenates the text parts of an agent event, ignoring tool calls."""
+    if not event.content or not event.content.parts:
+        return ""
+    return "".join(part.text for part in event.content.parts if part.text)
+
+
+def throttled(
+    interval_seconds: float,
+) -> Callable[[Callable[..., T]], Callable[..., T | None]]:
+    """
+    Runs a function at most once every `interval_seconds`, and in one thread at
+    a time. Calls made too soon, or while it runs, are skipped and return None.
+    Meant for clean-ups triggered by frequent events such as renders.
+    """
+
+    def decorator(function: Callable[..., T]) -> Callable[..., T | None]:
+        lock = threading.Lock()
+        last_run = float("-inf")
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs) -> T | None:
+            nonlocal last_run
+            if not lock.acquire(blocking=False):
+                return None
+            try:
+                if time.monotonic() - last_run < interval_seconds:
+                    return None
+                last_run = time.monotonic()
+                return function(*args, **kwargs)
+            finally:
+                lock.release()
+
+        return wrapper
+
+    return decorator
+
+
 def load_prompt_template(template_path: str) -> str:
     with open(template_path, "r", encoding="utf-8") as file:
         return file.read()
+
+
+@contextmanager
+def atomic_write(path: str) -> Iterator[str]:
+    """
+    Yields a temporary path next to `path` to write the file to, and moves it
+    into place once written, so readers never see a partial file. The
+    temporary file is removed if writing it fails.
+
+    Args:
+        path: str - The final path of the file.
+
+    Yields:
+        str - The path to write the content to.
+    """
+    temp_path = os.path.join(os.path.dirname(path), f".{uuid.uuid4().hex}.tmp")
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def touch(path: str) -> bool:
+    """
+    Marks a file as recently used for `prune_directory_lru`.
+
+    Returns:
+        bool: Whether the file exists.
+    """
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def prune_directory_lru(directory: str, max_bytes: int) -> int:
+    """
+    Deletes the least recently used files of a directory until it fits in
+    `max_bytes`. Files are ordered by modification time, so readers should
+    touch a file when they use it.
+
+    Returns:
+        int: The number of files deleted.
+    """
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    deleted = 0
+
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+        deleted += 1
+
+    return deleted
+
+
+def _tree_usage(path: str) -> tuple[float, int]:
+    """The latest modification time and the total size of a directory tree."""
+    latest = os.stat(path).st_mtime
+    total_bytes = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            latest = max(latest, stat.st_mtime)
+            total_bytes += stat.st_size
+    return latest, total_bytes
+
+
+def prune_subdirectories_lru(
+    directory: str, max_bytes: int, min_age_seconds: float = 0
+) -> list[str]:
+    """
+    Deletes the least recently used subdirectories of a directory until it
+    fits in `max_bytes`. A subdirectory is as recent as the newest file in it
+    (or the directory itself, touch it when it is used), and is never deleted
+    before it is `min_age_seconds` old.
+
+    Returns:
+        list[str]: The names of the subdirectories deleted.
+    """
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.is_dir(follow_symlinks=False):
+            try:
+                latest, size = _tree_usage(entry.path)
+            except FileNotFoundError:
+                continue
+            entries.append((latest, size, entry.name))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    cutoff = time.time() - min_age_seconds
+    deleted = []
+
+    for latest, size, name in sorted(entries):
+        if total_bytes <= max_bytes or latest > cutoff:
+            break
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        total_bytes -= size
+        deleted.append(name)
+
+    return deleted
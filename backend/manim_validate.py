@@ -0,0 +1,278 @@
+import ast
+import builtins
+import functools
+from dataclasses import dataclass
+
+# Modules a generated scene has no reason to import
+FORBIDDEN_MODULES = {
+    "asyncio",
+    "builtins",
+    "ctypes",
+    "http",
+    "importlib",
+    "multiprocessing",
+    "os",
+    "pathlib",
+    "pickle",
+    "requests",
+    "shutil",
+    "signal",
+    "socket",
+    "subprocess",
+    "sys",
+    "threading",
+    "urllib",
+}
+
+# Builtins a generated scene has no reason to call
+FORBIDDEN_CALLS = {
+    "__import__",
+    "breakpoint",
+    "compile",
+    "eval",
+    "exec",
+    "exit",
+    "input",
+    "open",
+    "quit",
+}
+
+# Modules whose star imports are resolved, importing anything else just to
+# list its names could run arbitrary code in the API process
+STAR_IMPORT_MODULES = {"manim", "math", "numpy", "random"}
+
+# Scene classes the animation may derive from
+SCENE_BASES = {
+    "Scene",
+    "MovingCameraScene",
+    "ThreeDScene",
+    "ZoomedScene",
+    "VectorScene",
+    "LinearTransformationScene",
+}
+
+
+@dataclass
+class ValidationIssue:
+    """A problem found in a script before rendering it."""
+
+    code: str
+    message: str
+    line: int | None = None
+
+    def __str__(self) -> str:
+        location = f"line {self.line}: " if self.line is not None else ""
+        return f"{location}{self.message} [{self.code}]"
+
+
+@functools.cache
+def _star_import_names(module_name: str) -> frozenset[str] | None:
+    """The names `from <module_name> import *` binds, None if it is unknown."""
+    if module_name not in STAR_IMPORT_MODULES:
+        return None
+
+    try:
+        module = __import__(module_name, fromlist=["*"])
+    except ImportError:
+        return None
+
+    # A directory named after the module (e.g. ./manim/, the renders' working
+    # directory) imports as an empty namespace package, not the library
+    if getattr(module, "__file__", None) is None:
+        return None
+
+    names = getattr(module, "__all__", None)
+    if names is None:
+        names = [name for name in dir(module) if not name.startswith("_")]
+    return frozenset(names)
+
+
+def preload_star_imports() -> None:
+    """
+    Imports the star import modules ahead of the first validation. Importing
+    manim takes seconds, call this from a worker thread at startup.
+    """
+    for module_name in STAR_IMPORT_MODULES:
+        _star_import_names(module_name)
+
+
+def _check_imports(module: ast.Module) -> list[ValidationIssue]:
+    issues = []
+    for node in ast.walk(module):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules = [node.module or ""]
+        else:
+            continue
+
+        for name in modules:
+            if name.split(".")[0] in FORBIDDEN_MODULES:
+                issues.append(
+                    ValidationIssue(
+                        "forbidden-import",
+                        f"Import of '{name}' is not allowed",
+                        node.lineno,
+                    )
+                )
+    return issues
+
+
+def _check_calls(module: ast.Module) -> list[ValidationIssue]:
+    issues = []
+    for node in ast.walk(module):
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in FORBIDDEN_CALLS
+        ):
+            issues.append(
+                ValidationIssue(
+                    "forbidden-call",
+                    f"Call to '{node.func.id}' is not allowed",
+                    node.lineno,
+                )
+            )
+    return issues
+
+
+def _check_scene(module: ast.Module, scene_name: str) -> list[ValidationIssue]:
+    scene = next(
+        (
+            node
+            for node in module.body
+            if isinstance(node, ast.ClassDef) and node.name == scene_name
+        ),
+        None,
+    )
+    if scene is None:
+        return [ValidationIssue("missing-scene", f"No class named '{scene_name}'")]
+
+    issues = []
+    # Bases are matched by name, `Scene` and `manim.Scene` alike
+    base_names = {
+        base.id if isinstance(base, ast.Name) else base.attr
+        for base in scene.bases
+        if isinstance(base, (ast.Name, ast.Attribute))
+    }
+    if not base_names & SCENE_BASES:
+        issues.append(
+            ValidationIssue(
+                "invalid-scene",
+                f"'{scene_name}' must derive from Scene (or another scene class)",
+                scene.lineno,
+            )
+        )
+
+    has_construct = any(
+        isinstance(node, ast.FunctionDef) and node.name == "construct"
+        for node in scene.body
+    )
+    if not has_construct:
+        issues.append(
+            ValidationIssue(
+                "missing-construct",
+                f"'{scene_name}' has no construct() method",
+                scene.lineno,
+            )
+        )
+    return issues
+
+
+def _bound_names(module: ast.Module) -> set[str] | None:
+    """
+    Every name the script binds anywhere, or None when a star import cannot
+    be resolved. Scopes are not told apart: the check only catches names that
+    are never defined at all, which is what generated code gets wrong.
+    """
+    names: set[str] = set()
+    for node in ast.walk(module):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            imported = _imported_names(node)
+            if imported is None:
+                return None
+            names.update(imported)
+    return names
+
+
+def _imported_names(node: ast.Import | ast.ImportFrom) -> set[str] | None:
+    """The names an import statement binds, None for an unresolvable star."""
+    if isinstance(node, ast.Import):
+        return {(alias.asname or alias.name).split(".")[0] for alias in node.names}
+
+    names: set[str] = set()
+    for alias in node.names:
+        if alias.name != "*":
+            names.add(alias.asname or alias.name)
+            continue
+        star_names = _star_import_names(node.module or "")
+        if star_names is None:
+            return None
+        names.update(star_names)
+    return names
+
+
+def _check_names(module: ast.Module) -> list[ValidationIssue]:
+    bound = _bound_names(module)
+    if bound is None:
+        return []
+    bound.update(dir(builtins))
+
+    issues = []
+    reported: set[str] = set()
+    for node in ast.walk(module):
+        if (
+            isinstance(node, ast.Name)
+            and isinstance(node.ctx, ast.Load)
+            and node.id not in bound
+            and node.id not in reported
+        ):
+            reported.add(node.id)
+            issues.append(
+                ValidationIssue(
+                    "undefined-name", f"Name '{node.id}' is not defined", node.lineno
+                )
+            )
+    return issues
+
+
+def validate_script(
+    code: str, scene_name: str = "SolutionAnimation"
+) -> list[ValidationIssue]:
+    """
+    Statically checks a generated script before it is rendered.
+
+    Catches what would otherwise only fail after a render slot was taken:
+    syntax errors, a missing scene class or `construct()`, names defined
+    neither by the script nor by its imports (resolved against the manim
+    namespace for `from manim import *`), and imports or calls a scene has no
+    business making.
+
+    Args:
+        code: str - The source code of the script.
+        scene_name: str - The name of the scene class to render.
+
+    Returns:
+        list[ValidationIssue] - The problems found, empty if the script is valid.
+    """
+    try:
+        module = ast.parse(code)
+    except SyntaxError as e:
+        return [ValidationIssue("syntax-error", e.msg, e.lineno)]
+
+    return [
+        *_check_scene(module, scene_name),
+        *_check_imports(module),
+        *_check_calls(module),
+        *_check_names(module),
+    ]
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+from dataclasses import asdict, dataclass, field
+
+from google.adk.agents import Agent
+from google.genai.types import Content, GenerateContentConfig
+
+from agent_registry import AgentRegistry
+from image_processing import image_to_part
+from manim_utils import (
+    Timer,
+    atomic_write,
+    event_text,
+    prune_directory_lru,
+    touch,
+)
+from session_manager import session_manager
+from upload_store import upload_id_of
+
+# How image questions reach the agents:
+# - "extract": the problem is transcribed from the image once, and every agent
+#   (links, chat, video) works from that text
+# - "image": every agent is sent the image itself
+IMAGE_INPUT_MODE = os.getenv("IMAGE_INPUT_MODE", "extract")
+
+PROBLEM_CACHE_DIR = os.getenv("PROBLEM_CACHE_DIR", "./cache/problems/")
+
+# Upper bound for the extracted problems kept on disk
+PROBLEM_CACHE_MAX_BYTES = int(
+    os.getenv("PROBLEM_CACHE_MAX_BYTES", str(64 * 1024**2))
+)
+
+APP_NAME = "problem-extraction"
+USER_ID = "ProblemExtractionAgent"
+
+EXTRACTION_AGENT = "problem_extraction_agent"
+
+EXTRACTION_TEMPLATE_PATH = "templates/problem_extraction.md"
+
+os.makedirs(PROBLEM_CACHE_DIR, exist_ok=True)
+
+
+@dataclass
+class Problem:
+    """A problem transcribed from an image, shared by every agent."""
+
+    problem: str
+    topics: list[str] = field(default_factory=list)
+
+    def to_text(self) -> str:
+        text = f"Problem (transcribed from the student's image):\n{self.problem}"
+        if self.topics:
+            text += f"\n\nTopics: {', '.join(self.topics)}"
+        return text
+
+
+def initialize_agents(templates: dict[str, str]) -> dict[str, Agent]:
+    """Builds the extraction agent from its prompt template."""
+    extraction_agent = Agent(
+        model="gemini-2.5-flash",
+        name=EXTRACTION_AGENT,
+        instruction=templates[EXTRACTION_AGENT],
+        generate_content_config=GenerateContentConfig(
+            temperature=0, response_mime_type="application/json"
+        ),
+    )
+    return {extraction_agent.name: extraction_agent}
+
+
+# Rebuilds the agent when its template changes, like the video agents
+agent_registry = AgentRegistry(
+    APP_NAME, {EXTRACTION_AGENT: EXTRACTION_TEMPLATE_PATH}, initialize_agents
+)
+
+# Extractions in progress by image hash, concurrent requests for the same
+# image (e.g. /links and /manim/jobs on submit) wait for a single one
+_inflight: dict[str, asyncio.Task] = {}
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(PROBLEM_CACHE_DIR, f"{key}.json")
+
+
+def _lookup(key: str) -> Problem | None:
+    path = _cache_path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            problem = Problem(**json.load(file))
+        touch(path)
+        return problem
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _store(key: str, problem: Problem) -> None:
+    with atomic_write(_cache_path(key)) as temp_path:
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(asdict(problem), file)
+    prune_directory_lru(PROBLEM_CACHE_DIR, PROBLEM_CACHE_MAX_BYTES)
+
+
+def _parse_problem(text: str) -> Problem | None:
+    text = text.strip().removeprefix("```json").removeprefix("```")
+    text = text.removesuffix("```").strip()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("problem"), str):
+        return None
+
+    topics = data.get("topics")
+    if not isinstance(topics, list):
+        topics = []
+    return Problem(
+        problem=data["problem"].strip(),
+        topics=[str(topic) for topic in topics],
+    )
+
+
+async def _extract(key: str, image_data: bytes) -> Problem | None:
+    content = Content(role="user", parts=[await image_to_part(image_data)])
+
+    try:
+        with Timer(f"Extract Problem ({key[:12]})"):
+            text = ""
+            async with session_manager.session(APP_NAME, USER_ID) as session_id:
+                runner = agent_registry.get_runner(EXTRACTION_AGENT)
+                async for event in runner.run_async(
+                    user_id=USER_ID, session_id=session_id, new_message=content
+                ):
+                    if event.is_final_response():
+                        text = event_text(event)
+    except Exception as e:
+        print(f"Failed to extract the problem of {key[:12]}: {e}")
+        return None
+
+    problem = _parse_problem(text)
+    if problem is None or not problem.problem:
+        print(f"No problem extracted from {key[:12]}, sending the image instead")
+        return None
+
+    try:
+        await asyncio.to_thread(_store, key, problem)
+    except OSError as e:
+        print(f"Failed to cache the problem of {key[:12]}: {e}")
+    return problem
+
+
+async def extract_problem(image_data: bytes) -> Problem | None:
+    """
+    Transcribes the problem of an image once, for every agent to work from.
+
+    Problems are cached by the hash of the image (the same id as its upload),
+    and concurrent requests for the same image share a single extraction.
+
+    Args:
+        image_data: bytes - The content of the image.
+
+    Returns:
+        Problem | None - The problem, or None if it could not be extracted (or
+            `IMAGE_INPUT_MODE` is "image"), in which case callers should send
+            the image itself.
+    """
+    if IMAGE_INPUT_MODE != "extract" or not image_data:
+        return None
+
+    key = upload_id_of(image_data)
+    problem = await asyncio.to_thread(_lookup, key)
+    if problem is not None:
+        print(f"Problem of {key[:12]} served from the cache")
+        return problem
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_extract(key, image_data))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+
+    # A cancelled request must not cancel the extraction other requests await
+    return await asyncio.shield(task)
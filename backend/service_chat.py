@@ -8,7 +8,9 @@ import os
 import json
 import base64
 import io
-from typing import List, Dict, Any, Optional
+import uuid
+from contextlib import aclosing
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from dataclasses import dataclass
 from PIL import Image
 
@@ -17,10 +19,17 @@ from google.adk.agents import Agent, LlmAgent
 from google.adk.tools import google_search
 from google.adk.tools.agent_tool import AgentTool
 from google.genai import types
-from google.genai.types import Blob, Content, Part
-from google.adk.sessions import InMemorySessionService
+from google.genai.types import Content, Part
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.plugins import BasePlugin
 from google.adk.runners import Runner
 
+import llm_cache
+from image_processing import image_to_part
+from manim_utils import event_text
+from problem_extraction import extract_problem
+from session_manager import session_manager
+
 @dataclass
 class Link:
     """Data structure for search result links."""
@@ -29,8 +38,11 @@ class Link:
     snippet: str
     relevance_score: float = 0.0
 
-def convert_image_bytes_to_part(image_data: bytes) -> Part:
+async def convert_image_bytes_to_part(image_data: bytes) -> Part:
     """Convert image bytes to a Part object for agent consumption.
+
+    The image is normalized first (real format, no metadata, downscaled and
+    recompressed), see `image_processing.normalize_image`.
     
     Args:
         image_data: Raw image data in bytes
@@ -38,27 +50,9 @@ def convert_image_bytes_to_part(image_data: bytes) -> Part:
     Returns:
         Part object containing the image blob
     """
-    # Try to determine the image format by examining the header bytes
-    mime_type = "image/png"  # default
-    
-    if image_data.startswith(b'\xff\xd8\xff'):
-        mime_type = "image/jpeg"
-    elif image_data.startswith(b'\x89PNG'):
-        mime_type = "image/png"
-    elif image_data.startswith(b'GIF87a') or image_data.startswith(b'GIF89a'):
-        mime_type = "image/gif"
-    elif image_data.startswith(b'RIFF') and b'WEBP' in image_data[:12]:
-        mime_type = "image/webp"
-    
-    # Create a blob from the bytes
-    blob = Blob(data=image_data, mime_type=mime_type)
-    
-    # Create a Part object with the blob
-    part = Part(inline_data=blob)
-    
-    return part
+    return await image_to_part(image_data)
 
-def convert_base64_image_to_part(image_base64: str) -> Part:
+async def convert_base64_image_to_part(image_base64: str) -> Part:
     """Convert base64 encoded image to a Part object for agent consumption.
     
     Args:
@@ -71,7 +65,7 @@ def convert_base64_image_to_part(image_base64: str) -> Part:
     image_bytes: bytes = base64.b64decode(image_base64)
     
     # Use the existing function to convert bytes to part
-    return convert_image_bytes_to_part(image_bytes)
+    return await convert_image_bytes_to_part(image_bytes)
 
 # Define the Educational Search Agent
 search_agent = Agent(
@@ -90,7 +84,9 @@ search_agent = Agent(
     
     Respond with an array of JSON objects with {{'title': ..., 'url': ..., 'snippet': ..., 'relevance_score': ...}} for each relevant educational link resource and nothing else so it is easy to parse in python. Please stick to this format strictly and don't put any extra characters at all.""",
     description="An agent specialized in finding educational resources for math and science problems",
-    tools=[google_search]
+    tools=[google_search],
+    before_model_callback=llm_cache.before_model_callback,
+    after_model_callback=llm_cache.after_model_callback,
 )
 
 # Define the Conversation Tutor Agent
@@ -114,7 +110,9 @@ conversation_agent = LlmAgent(
     - Ask follow-up questions to ensure understanding
     
     Keep responses concise but thorough. Adapt your explanations to the student's level of understanding.""",
-    description="An expert educational tutor specialized in math and science problem-solving"
+    description="An expert educational tutor specialized in math and science problem-solving",
+    before_model_callback=llm_cache.before_model_callback,
+    after_model_callback=llm_cache.after_model_callback,
 )
 
 # Define the Coordinator Agent that manages sub-agents
@@ -134,46 +132,81 @@ service_chat_agent = LlmAgent(
     tools=[
         AgentTool(agent=search_agent),
         AgentTool(agent=conversation_agent),
-    ]
+    ],
+    before_model_callback=llm_cache.before_model_callback,
+    after_model_callback=llm_cache.after_model_callback,
 )
 
 # Instantiate constants
 APP_NAME = "TeachMe"
 USER_ID = "ChatServiceAgent"
-SESSION_ID = "1"
 
-# Session and Runner
-async def setup_session_and_runner():
-    session_service = InMemorySessionService()
-    session = await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
-    runner = Runner(agent=service_chat_agent, app_name=APP_NAME, session_service=session_service)
-    return session, runner
+# How requests reach the specialist agents:
+# - "direct": each endpoint runs the agent for its intent (search or tutor)
+# - "coordinator": every request goes through service_chat_agent, which picks
+#   the specialist with an extra model call
+CHAT_ROUTING_MODE = os.getenv("CHAT_ROUTING_MODE", "direct")
+
+def build_runners(plugins: Optional[List[BasePlugin]] = None) -> Dict[str, Runner]:
+    """Build one runner per routing target, sharing the session store.
+    
+    Args:
+        plugins: Optional ADK plugins applied to every agent run (e.g. metrics)
+        
+    Returns:
+        Runners for the "search", "conversation" and "coordinator" targets
+    """
+    agents = {
+        "search": search_agent,
+        "conversation": conversation_agent,
+        "coordinator": service_chat_agent,
+    }
+    return {
+        target: Runner(agent=agent, app_name=APP_NAME, session_service=session_manager.service, plugins=plugins or [])
+        for target, agent in agents.items()
+    }
+
+# Runners shared by every request, each request runs in its own session
+runners = build_runners()
+
+def get_runner(intent: str) -> Runner:
+    """Return the runner handling an intent ("search" or "conversation")."""
+    if CHAT_ROUTING_MODE == "coordinator":
+        return runners["coordinator"]
+    return runners[intent]
+
+
+class ConversationNotFoundError(Exception):
+    """Raised when a conversation id is unknown, e.g. after its session expired."""
 
 # Agent Interaction
-async def call_chat_agent(content: Content):
+async def call_chat_agent(content: Content, intent: str, session_id: Optional[str] = None):
     """Call the chat agent with Content that may include text and/or images.
     
     Args:
         content: Content object containing text and/or image parts
+        intent: What the request is for, "search" or "conversation"
+        session_id: Session to continue (e.g. a conversation), or None for a
+            one-off session deleted after the call
         
     Returns:
         Agent response as string
     """
-    session, runner = await setup_session_and_runner()
-    
-    try:
-        events = runner.run_async(user_id=USER_ID, session_id=SESSION_ID, new_message=content)
+    async with session_manager.session(APP_NAME, USER_ID, session_id) as session_id:
+        try:
+            events = get_runner(intent).run_async(user_id=USER_ID, session_id=session_id, new_message=content)
 
-        async for event in events:
-            if event.is_final_response():
-                final_response = event.content.parts[0].text
-                return final_response
-        
-        return ""
-    
-    except Exception as e:
-        print(f"Error in call_chat_agent: {e}")
-        return ""
+            async with aclosing(events):
+                async for event in events:
+                    if event.is_final_response():
+                        final_response = event.content.parts[0].text
+                        return final_response
+
+            return ""
+
+        except Exception as e:
+            print(f"Error in call_chat_agent: {e}")
+            return ""
 
 async def get_links(image_data: bytes, context: str) -> List[Dict[str, str]]:
     """
@@ -207,14 +240,18 @@ async def get_links(image_data: bytes, context: str) -> List[Dict[str, str]]:
             Please search for relevant educational content and return the most helpful resources. Respond with concise web links only to all the resources."""
             parts.append(Part(text=search_prompt))
         
-        # Add image if provided
+        # Add image if provided, as the problem transcribed from it when possible
         if image_data and len(image_data) > 0:
-            image_part = convert_image_bytes_to_part(image_data)
-            parts.append(image_part)
+            problem = await extract_problem(image_data)
+            if problem is not None:
+                parts.append(Part(text=problem.to_text()))
+            else:
+                parts.append(await convert_image_bytes_to_part(image_data))
             
             # If we only have an image, add a text prompt for analysis
             if not context or not context.strip():
-                analysis_prompt = """Analyze this image and find relevant educational resources. Focus on:
+                subject = "problem" if problem is not None else "image"
+                analysis_prompt = f"""Analyze this {subject} and find relevant educational resources. Focus on:
                 1. Tutorial websites and step-by-step guides
                 2. Educational videos related to the concepts shown
                 3. Interactive learning tools
@@ -233,7 +270,7 @@ async def get_links(image_data: bytes, context: str) -> List[Dict[str, str]]:
         
         # Execute search using the agent
         print(f"Calling search agent with {len(parts)} parts...")
-        agent_response = await call_chat_agent(content)
+        agent_response = await call_chat_agent(content, "search")
 
         print(f"Agent response received: {agent_response}")
         
@@ -259,63 +296,111 @@ async def get_links(image_data: bytes, context: str) -> List[Dict[str, str]]:
         print(f"Error in get_links: {e}")
         return _get_fallback_links()
 
-async def converse(chat_history: List[Dict[str, str]], image_data: bytes = None) -> Dict[str, Any]:
+async def prepare_conversation(
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    image_data: bytes = None,
+    message: Optional[str] = None,
+    conversation_id: Optional[str] = None,
+) -> Tuple[str, Content]:
     """
-    Second endpoint: Handle conversational interaction about the problem.
-    Uses the conversation agent for educational tutoring.
-    
+    Resolves the conversation of a chat turn and builds the agent input for it.
+
+    The conversation is kept server-side in an agent session identified by
+    `conversation_id`. Follow-up turns only send the new `message` with that
+    id; the full `chat_history` is only needed to start (or restart) a
+    conversation.
+
     Args:
         chat_history: List of chat messages with role and content
         image_data: Optional image data in bytes for visual context
-    
+        message: The new user message of a follow-up turn
+        conversation_id: The id of the conversation to continue, if any
+
     Returns:
-        Response with AI message, suggestions, and follow-up questions
+        The id of the conversation to run the turn in, and the Content to send
+
+    Raises:
+        ConversationNotFoundError: If the conversation is unknown and no
+            history was provided to restart it.
     """
-    print(f"Processing conversation with {len(chat_history)} messages and image: {bool(image_data)}")
-    
-    try:
+    chat_history = chat_history or []
+    print(f"Processing conversation {conversation_id or '(new)'} with {len(chat_history)} messages and image: {bool(image_data)}")
+
+    continuing = conversation_id is not None and session_manager.exists(APP_NAME, USER_ID, conversation_id)
+    if conversation_id is not None and not continuing and not chat_history:
+        raise ConversationNotFoundError(f"Unknown conversation: {conversation_id}")
+    if not continuing:
+        conversation_id = uuid.uuid4().hex
+
+    if continuing:
+        # The session already holds the conversation, only send the new turn
+        if message is None:
+            message = chat_history[-1].get('content', '')
+        conversation_text = _build_follow_up_prompt(message)
+    else:
+        if message is not None:
+            chat_history = [*chat_history, {'role': 'user', 'content': message}]
+
         # Extract context from first message if available
         context = ""
         if chat_history and len(chat_history) > 0:
             first_message = chat_history[0].get('content', '')
             if len(first_message) > 50:  # Assume longer first messages contain problem context
                 context = first_message
-        
+
         # Build conversation prompt for the tutor agent
         conversation_text = _build_conversation_prompt(chat_history, context)
-        
-        # Prepare parts for the Content object
-        parts = [Part(text=conversation_text)]
-        
-        # Add image if provided
-        if image_data and len(image_data) > 0:
-            image_part = convert_image_bytes_to_part(image_data)
-            parts.append(image_part)
-        
-        # Create Content object
-        content = Content(role='user', parts=parts)
-        
+
+    # Prepare parts for the Content object
+    parts = [Part(text=conversation_text)]
+
+    # Add image if provided, as the problem transcribed from it when possible
+    if image_data and len(image_data) > 0:
+        problem = await extract_problem(image_data)
+        if problem is not None:
+            parts.append(Part(text=problem.to_text()))
+        else:
+            parts.append(await convert_image_bytes_to_part(image_data))
+
+    # Create Content object
+    return conversation_id, Content(role='user', parts=parts)
+
+async def converse(
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    image_data: bytes = None,
+    message: Optional[str] = None,
+    conversation_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Second endpoint: Handle conversational interaction about the problem.
+    Uses the conversation agent for educational tutoring.
+
+    See `prepare_conversation` for how the conversation is resolved.
+    
+    Returns:
+        Response with AI message, suggestions, follow-up questions and the
+        conversation id
+
+    Raises:
+        ConversationNotFoundError: If the conversation is unknown and no
+            history was provided to restart it.
+    """
+    conversation_id, content = await prepare_conversation(chat_history, image_data, message, conversation_id)
+    
+    try:
         # Use the conversation agent to generate response
-        print(f"Calling conversation agent with {len(parts)} parts...")
-        agent_response = await call_chat_agent(content)
+        print(f"Calling conversation agent with {len(content.parts)} parts...")
+        agent_response = await call_chat_agent(content, "conversation", session_id=conversation_id)
         
         print(f"Conversation agent response: {agent_response}")
         
         # Check if we got a valid response
         if not agent_response or len(agent_response.strip()) == 0:
             print("Empty response from conversation agent, using fallback")
-            return {
-                "response": "I apologize, but I'm having trouble processing your request right now. Could you please rephrase your question?",
-                "suggestions": ["Try breaking down the problem into smaller parts", "What specific concept are you struggling with?"],
-                "follow_up_questions": []
-            }
+            return _conversation_response(FALLBACK_CHAT_RESPONSE, conversation_id)
 
         # Process the agent response
-        response_data = {
-            "response": agent_response,
-            "suggestions": ["Try breaking down the problem into smaller parts", "What specific concept are you struggling with?"],
-            "follow_up_questions": []
-        }
+        response_data = _conversation_response(agent_response, conversation_id)
         # response_data = _process_conversation_response(agent_response, chat_history)
         
         print(f"Generated response: {response_data['response'][:100]}...")
@@ -323,13 +408,73 @@ async def converse(chat_history: List[Dict[str, str]], image_data: bytes = None)
         
     except Exception as e:
         print(f"Error in converse: {e}")
-        return {
-            "response": "I apologize, but I'm having trouble processing your request right now. Could you please rephrase your question?",
-            "suggestions": ["Try breaking down the problem into smaller parts", "What specific concept are you struggling with?"],
-            "follow_up_questions": []
-        }
+        return _conversation_response(FALLBACK_CHAT_RESPONSE, conversation_id)
+
+async def stream_conversation(conversation_id: str, content: Content) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of `converse`: runs a prepared chat turn and yields its
+    events as soon as the model produces them.
+
+    Args:
+        conversation_id: The conversation returned by `prepare_conversation`
+        content: The Content returned by `prepare_conversation`
+
+    Yields:
+        (event, data) pairs: one "start" with the conversation id, a "delta"
+        with the text of every chunk, then one "done" with the full response
+        in the same shape as `converse`
+    """
+    yield "start", {"conversation_id": conversation_id}
+
+    chunks = []
+    try:
+        print(f"Streaming conversation agent with {len(content.parts)} parts...")
+        async with session_manager.session(APP_NAME, USER_ID, conversation_id) as session_id:
+            events = get_runner("conversation").run_async(
+                user_id=USER_ID,
+                session_id=session_id,
+                new_message=content,
+                run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+            )
+
+            # Closing the generator on early exit cancels the pending model call
+            async with aclosing(events):
+                async for event in events:
+                    text = event_text(event)
+                    if event.partial and text:
+                        chunks.append(text)
+                        yield "delta", {"text": text}
+                    elif event.is_final_response():
+                        # The final event repeats the streamed chunks, only forward
+                        # it when the model did not stream (e.g. a single chunk)
+                        if text and not chunks:
+                            chunks.append(text)
+                            yield "delta", {"text": text}
+                        break
+    except Exception as e:
+        print(f"Error in stream_conversation: {e}")
+
+    agent_response = "".join(chunks)
+    if not agent_response.strip():
+        print("Empty response from conversation agent, using fallback")
+        agent_response = FALLBACK_CHAT_RESPONSE
+        yield "delta", {"text": agent_response}
+
+    print(f"Streamed response: {agent_response[:100]}...")
+    yield "done", _conversation_response(agent_response, conversation_id)
 
 # Helper functions for agent response processing
+FALLBACK_CHAT_RESPONSE = "I apologize, but I'm having trouble processing your request right now. Could you please rephrase your question?"
+
+def _conversation_response(agent_response: str, conversation_id: str) -> Dict[str, Any]:
+    """Wrap the tutor's answer with suggestions and the conversation id."""
+    return {
+        "response": agent_response,
+        "suggestions": ["Try breaking down the problem into smaller parts", "What specific concept are you struggling with?"],
+        "follow_up_questions": [],
+        "conversation_id": conversation_id,
+    }
+
 def _parse_search_response(agent_response: str) -> List[Dict[str, str]]:
     """Parse the search agent response to extract educational links."""
     # The search agent should return structured information
@@ -396,6 +541,12 @@ def _build_conversation_prompt(chat_history: List[Dict[str, str]], context: str)
     
     return prompt
 
+def _build_follow_up_prompt(message: str) -> str:
+    """Build the prompt of a follow-up turn, the earlier turns are in the session."""
+    return f"""Student: {message}
+
+    Continue helping the student with the same problem, following the same guidelines as before."""
+
 def _process_conversation_response(agent_response: str, chat_history: List[Dict[str, str]]) -> Dict[str, Any]:
     """Process the conversation agent response and add suggestions/follow-ups."""
     
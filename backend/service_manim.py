@@ -1,46 +1,268 @@
 import asyncio
 import base64
+import os
+from contextlib import aclosing
 from dataclasses import dataclass
 
 import dotenv
-from google.genai.types import Blob, Content, Part
+from google.genai.types import Content, Part
 
-from manim_agents import SESSION_ID, USER_ID, prepare_session
-from manim_gen import fetch_desired_video
-from manim_utils import Timer
+from image_processing import image_to_part
+from manim_agents import APP_NAME, USER_ID, agent_registry
+from manim_autofix import tex_fallback
+from manim_errors import Recovery, RenderError, render_metrics
+from manim_gen import RenderJob, render_script, start_render_job, write_code_to_file
+from manim_jobs import JobStage, current_job, record_timing, set_stage
+from manim_utils import Timer, event_text
+from problem_extraction import extract_problem
+from session_manager import session_manager
 
 dotenv.load_dotenv()
 
+# How the agents are sequenced:
+# - "pipeline": math_agent and script_agent run concurrently, their outputs are
+#   merged in code and handed to video_agent
+# - "orchestrator": orchestrator_agent sequences the agents itself, at the
+#   cost of extra model turns
+PIPELINE_MODE = os.getenv("MANIM_PIPELINE_MODE", "pipeline")
+
+# Recoveries tried for a script that failed to compile; local ones (re-render,
+# LaTeX fallback) count too, only the rest go back to video_agent with the error
+REPAIR_ATTEMPTS = int(os.getenv("MANIM_REPAIR_ATTEMPTS", "2"))
+
+# Only the end of the manim log is sent back, that is where the error is
+REPAIR_LOG_CHARS = 4000
+
 
 @dataclass
 class VideoContext:
-    image: str | None = None
+    image: bytes | None = None
     context: str | None = None
 
 
-def convert_image_to_part(image: str) -> Part:
-    # Decode the base64 string to bytes
-    image_bytes: bytes = base64.b64decode(image)
+def image_bytes_of(image: bytes | str) -> bytes:
+    """
+    The raw bytes of a request image. Images are passed around as bytes, the
+    base64 string form is only decoded here for callers that still use it.
+    """
+    if isinstance(image, str):
+        return base64.b64decode(image)
+    return bytes(image)
+
+
+async def image_input_part(image: bytes) -> Part:
+    """
+    The part standing for the image of a request: the problem transcribed from
+    it when possible, so the agents work from text, the image itself otherwise.
+    """
+    set_stage(JobStage.EXTRACTING)
+    with Timer("Extract Problem") as timer:
+        problem = await extract_problem(image)
+    record_timing("extracting", timer.duration)
+
+    if problem is None:
+        return await convert_image_to_part(image)
+    return Part(text=problem.to_text())
+
+
+async def convert_image_to_part(image: bytes | str) -> Part:
+    # Normalize the image (real format, downscaled) and wrap it in a Part
+    return await image_to_part(image_bytes_of(image))
+
+
+async def run_agent(
+    agent_name: str,
+    content: Content,
+    render_job: RenderJob | None = None,
+    step: str | None = None,
+) -> str:
+    """
+    Runs one agent in a session of its own, deleted once the run is over.
+
+    Args:
+        agent_name: str - The name of the agent to run.
+        content: Content - The message to send to the agent.
+        render_job: RenderJob | None - If given, the run is cut short as soon
+            as this render's video has compiled, cancelling any remaining
+            model turns (e.g. the orchestrator repeating the code).
+        step: str | None - The name to record the run's duration under,
+            defaults to the agent name.
+
+    Returns:
+        str: The text of the agent's final response.
+    """
+    runner = agent_registry.get_runner(agent_name)
+    response_text = ""
+
+    async with session_manager.session(APP_NAME, USER_ID) as session_id:
+        with Timer(f"Run {agent_name}") as timer:
+            events = runner.run_async(
+                user_id=USER_ID,
+                session_id=session_id,
+                new_message=content,
+            )
+            # Closing the generator on early exit cancels the pending model call
+            async with aclosing(events):
+                async for event in events:
+                    print(f"Agent took an action: {event.actions}")
+                    if event.is_final_response():
+                        response_text = event_text(event)
+                    if render_job is not None and render_job.compiled:
+                        print(f"Video compiled, stopping {agent_name}")
+                        break
+        record_timing(step or agent_name, timer.duration)
+
+    return response_text
 
-    # Create a blob from the bytes
-    blob = Blob(data=image_bytes, mime_type="image/png")
 
-    # Create a Part object with the blob
-    part = Part(inline_data=blob)
+def merge_plans(math_explanation: str, script: str) -> str:
+    """Combines the math explanation and the video script into the video brief."""
+    sections = [
+        "Create the Manim video for the plan below. Keep the math exactly as "
+        "explained and follow the structure and pacing of the script."
+    ]
+    if math_explanation:
+        sections.append(f"## Math Explanation\n\n{math_explanation}")
+    if script:
+        sections.append(f"## Video Script\n\n{script}")
 
-    return part
+    return "\n\n".join(sections)
+
+
+async def run_pipeline(content: Content, render_job: RenderJob) -> str:
+    """
+    Runs the agents as a fixed pipeline: the math explanation and the script are
+    written concurrently, then merged into the brief of the video agent, whose
+    response callback compiles the video.
+
+    Either of the first two agents may fail, the video is generated from the
+    other one's output; if both fail there is nothing to generate from.
+
+    Returns:
+        str: The brief given to the video agent, reused to repair its script.
+    """
+    math_explanation, script = await asyncio.gather(
+        run_agent("math_agent", content),
+        run_agent("script_agent", content),
+        return_exceptions=True,
+    )
 
+    outputs = {"math_agent": math_explanation, "script_agent": script}
+    for agent_name, output in outputs.items():
+        if isinstance(output, Exception):
+            print(f"Agent {agent_name} failed: {output}")
+            outputs[agent_name] = ""
 
-async def invoke_agent(context: VideoContext) -> str:
+    if not any(outputs.values()):
+        raise ValueError("Neither the math nor the script agent produced a plan")
+
+    brief = merge_plans(outputs["math_agent"], outputs["script_agent"])
+    brief_content = Content(role="user", parts=[Part(text=brief)])
+    await run_agent("video_agent", brief_content, render_job)
+
+    return brief
+
+
+def build_repair_brief(brief: str, code: str, failure: RenderError) -> str:
+    """Asks the video agent to fix a script, given why it failed to compile."""
+    sections = [
+        "The Manim script below failed to render. Fix the error and respond "
+        "with the complete corrected script, keeping everything that works."
+    ]
+    if brief:
+        sections.append(f"## Plan\n\n{brief}")
+    sections.append(f"## Script\n\n```python\n{code}\n```")
+    sections.append(f"## Error\n\n{failure.summary()}")
+    sections.append(f"## Log\n\n```\n{failure.log[-REPAIR_LOG_CHARS:]}\n```")
+
+    return "\n\n".join(sections)
+
+
+def _apply_tex_fallback(render_job: RenderJob, code: str) -> bool:
+    """Rewrites the failing LaTeX string of a script as text, if possible."""
+    code, fixes = tex_fallback(code, render_job.failure.tex_string)
+    for fix in fixes:
+        print(f"  line {fix.line}: {fix.description} [{fix.rule}]")
+    if not fixes:
+        return False
+
+    write_code_to_file(code, render_job)
+    return True
+
+
+async def repair_video(render_job: RenderJob, brief: str) -> None:
+    """
+    Recovers a script that failed to compile, at most `REPAIR_ATTEMPTS` times,
+    choosing the cheapest recovery for the kind of failure: re-rendering the
+    script as is, typesetting a failing LaTeX string as text, and otherwise
+    sending the script back to the video agent with the classified error. A
+    local recovery is only tried once, if it fails the video agent takes over.
+    Only the video stage runs again, the plan it was written from is reused.
+
+    Args:
+        render_job: RenderJob - The render whose script failed.
+        brief: str - The plan the script was written from, if any.
+    """
+    tried: set[Recovery] = set()
+
+    for attempt in range(1, REPAIR_ATTEMPTS + 1):
+        failure = render_job.failure
+        if render_job.compiled or failure is None:
+            return
+
+        code = ""
+        if os.path.isfile(render_job.script_path):
+            with open(render_job.script_path, "r", encoding="utf-8") as file:
+                code = file.read()
+
+        recovery = failure.recovery
+        if recovery in tried:
+            recovery = Recovery.LLM_REPAIR
+        tried.add(recovery)
+        print(
+            f"Repairing {render_job.render_id} with {recovery.value} "
+            f"({attempt}/{REPAIR_ATTEMPTS}): {failure}"
+        )
+
+        if recovery == Recovery.TEX_FALLBACK and not _apply_tex_fallback(
+            render_job, code
+        ):
+            recovery = Recovery.LLM_REPAIR
+
+        if recovery == Recovery.LLM_REPAIR:
+            repair_brief = build_repair_brief(brief, code, failure)
+            repair_content = Content(role="user", parts=[Part(text=repair_brief)])
+            await run_agent(
+                "video_agent", repair_content, render_job, step=f"repair_{attempt}"
+            )
+        else:
+            with Timer(f"Recover Render ({recovery.value})") as timer:
+                await render_script(render_job)
+            record_timing(f"repair_{attempt}", timer.duration)
+
+        render_metrics.record_recovery(recovery, render_job.compiled)
+
+
+def _failure_reason(render_job: RenderJob, agent_error: Exception | None) -> str:
+    """Why no video was produced: the last render failure, else the agent error."""
+    if render_job.failure is not None:
+        return render_job.failure.summary()
+    if agent_error is not None:
+        return f"{type(agent_error).__name__}: {agent_error}"
+    return "the agents did not produce a script"
+
+
+async def invoke_agent(context: VideoContext) -> RenderJob:
     # Unpack context
     image = context.image
     additional_context = context.context
     has_image = image is not None
     has_text = additional_context is not None
 
-    # Prepare a session
-    with Timer("Prepare Session"):
-        runner = await prepare_session()
+    # Give the render its own script, media directory and video path, reusing
+    # the API job id when running as a job so artifacts map back to the job
+    job = current_job()
+    render_job = start_render_job(job.job_id if job else None)
 
     # Bundle the context into a Content object
     input_content = None
@@ -55,62 +277,70 @@ async def invoke_agent(context: VideoContext) -> str:
     elif not has_text and has_image:
         input_content = Content(
             parts=[
-                convert_image_to_part(image),
+                await image_input_part(image),
             ]
         )
     else:
         input_content = Content(
             parts=[
-                convert_image_to_part(image),
+                await image_input_part(image),
                 Part(text=additional_context),
             ]
         )
 
-    # Invoke the agent with the provided context
+    # Invoke the agents with the provided context
+    agent_error: Exception | None = None
     try:
-        async for event in runner.run_async(
-            user_id=USER_ID,
-            session_id=SESSION_ID,
-            new_message=input_content,
-        ):
-            print(f"Agent took an action: {event.actions}")
+        if PIPELINE_MODE == "pipeline":
+            brief = await run_pipeline(input_content, render_job)
+        else:
+            await run_agent("orchestrator_agent", input_content, render_job)
+            brief = additional_context or ""
+
+        await repair_video(render_job, brief)
         print("Agent actions complete")
     except Exception as e:
+        agent_error = e
         print(f"Agent failed to take an action: {e}")
         print("Video may have been compiled, continuing anyway...")
 
     # Assume video has already been compiled
-    # Get most recent code and video file names
-    # If they match, then the video compiled successfully
-    # Return the video as a base64 encoded string
+    # Return the render so callers can stream its video from disk
     print("Fetching video...")
-    video: str = fetch_desired_video()
-    return video
+    set_stage(JobStage.PACKAGING)
+    if not os.path.isfile(render_job.video_path):
+        raise Exception(
+            f"Video failed to compile: {_failure_reason(render_job, agent_error)}"
+        ) from agent_error
+    return render_job
 
 
-async def generate_manim_video(image: str | None, context: str | None) -> str:
+async def generate_manim_video(
+    image: bytes | str | None, context: str | None
+) -> RenderJob:
     """This functino kicks off the video generation agent with the
     given image and context.
 
     Args:
         image (bytes): The bytes of the image to be used as context for the video.
+            A base64 encoded string is still accepted, and decoded once here.
         context (str): Additional context or instructions for video generation.
 
     Returns:
-        bytes: The bytes of the generated video.
+        RenderJob: The render job holding the generated video.
     """
     if not image and not context:
         raise ValueError("Image and/or context must be provided.")
 
     with Timer("Invoke Agent"):
-        video = await invoke_agent(
+        render_job = await invoke_agent(
             context=VideoContext(
-                image=image,
+                image=image_bytes_of(image) if image else None,
                 context=context,
             ),
         )
 
-    return video
+    return render_job
 
 
 if __name__ == "__main__":
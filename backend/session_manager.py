@@ -0,0 +1,126 @@
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from google.adk.sessions import InMemorySessionService
+
+# Upper bound for the agent sessions kept in memory across both services
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+
+# Idle sessions are dropped after this many seconds
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+
+
+@dataclass
+class _SessionEntry:
+    last_used: float = field(default_factory=time.monotonic)
+    active: int = 0
+
+
+class SessionManager:
+    """
+    Issues agent sessions from one long lived session service.
+
+    Sessions opened without an id are private to a single request and deleted
+    when it ends. Sessions opened with an id (e.g. a conversation) are kept
+    and reused until they have been idle for `ttl` seconds, or until they are
+    the least recently used ones once more than `max_sessions` are stored.
+    Sessions in use by a running request are never evicted.
+    """
+
+    def __init__(
+        self, max_sessions: int = SESSION_MAX_COUNT, ttl: int = SESSION_TTL_SECONDS
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.service = InMemorySessionService()
+        # Ordered from least to most recently used
+        self._entries: OrderedDict[tuple[str, str, str], _SessionEntry] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def exists(self, app_name: str, user_id: str, session_id: str) -> bool:
+        """Checks whether a session is still stored (i.e. was not evicted)."""
+        return (app_name, user_id, session_id) in self._entries
+
+    @asynccontextmanager
+    async def session(
+        self, app_name: str, user_id: str, session_id: str | None = None
+    ) -> AsyncIterator[str]:
+        """
+        Opens a session for the duration of a request.
+
+        Args:
+            app_name: str - The name of the agent application.
+            user_id: str - The user owning the session.
+            session_id: str | None - The id of a session to reuse or create, or
+                None for a new session deleted at the end of the request.
+
+        Yields:
+            str - The id of the session to run the agents in.
+        """
+        ephemeral = session_id is None
+        if ephemeral:
+            session_id = uuid.uuid4().hex
+        key = (app_name, user_id, session_id)
+
+        await self.prune()
+
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _SessionEntry()
+            await self.service.create_session(
+                app_name=app_name, user_id=user_id, session_id=session_id
+            )
+        self._entries.move_to_end(key)
+        entry.active += 1
+
+        try:
+            yield session_id
+        finally:
+            entry.active -= 1
+            entry.last_used = time.monotonic()
+            if ephemeral:
+                await self._delete(key)
+
+    async def _delete(self, key: tuple[str, str, str]) -> None:
+        self._entries.pop(key, None)
+        app_name, user_id, session_id = key
+        await self.service.delete_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+
+    async def prune(self) -> None:
+        """
+        Deletes idle sessions past the TTL, then the least recently used idle
+        sessions until there is room for a new one.
+        """
+        cutoff = time.monotonic() - self.ttl
+        idle = [key for key, entry in self._entries.items() if entry.active == 0]
+
+        expired = {key for key in idle if self._entries[key].last_used < cutoff}
+        remaining = len(self._entries) - len(expired)
+
+        evicted = []
+        for key in idle:
+            if remaining < self.max_sessions:
+                break
+            if key not in expired:
+                evicted.append(key)
+                remaining -= 1
+
+        for key in [*expired, *evicted]:
+            await self._delete(key)
+
+        if expired or evicted:
+            print(f"Evicted {len(expired) + len(evicted)} agent sessions")
+
+
+session_manager = SessionManager()
@@ -0,0 +1,134 @@
+import ast
+import glob
+import os
+import textwrap
+import unittest
+
+from manim_autofix import autofix_script, tex_fallback
+
+SCRIPT_DIR = "./manim/scripts/"
+
+# Fixes expected on the scripts of the repo, the others need none
+SCRIPT_FIXES = {
+    "eoyhglqrkm.py": {"deprecated-api": 1},
+    "sihhluycoj.py": {"raw-latex-string": 1},
+    "wpwguovotl.py": {"font-size-scale": 70},
+}
+
+
+def fix(code: str) -> tuple[str, list[str]]:
+    """Auto-fixes a snippet, returning the fixed code and the rules applied."""
+    fixed_code, fixes = autofix_script(textwrap.dedent(code))
+    return fixed_code, [fix.rule for fix in fixes]
+
+
+class RepoScriptsTest(unittest.TestCase):
+    def test_repo_scripts(self):
+        script_paths = sorted(glob.glob(os.path.join(SCRIPT_DIR, "*.py")))
+        self.assertTrue(script_paths)
+
+        for script_path in script_paths:
+            name = os.path.basename(script_path)
+            with self.subTest(script=name):
+                with open(script_path, "r", encoding="utf-8") as file:
+                    code = file.read()
+                fixed_code, fixes = autofix_script(code)
+
+                rules: dict[str, int] = {}
+                for applied in fixes:
+                    rules[applied.rule] = rules.get(applied.rule, 0) + 1
+                self.assertEqual(rules, SCRIPT_FIXES.get(name, {}))
+
+                if not fixes:
+                    self.assertEqual(fixed_code, code)
+                    continue
+
+                # Fixes keep the script valid, and leave nothing to fix
+                ast.parse(fixed_code)
+                self.assertEqual(autofix_script(fixed_code), (fixed_code, []))
+
+
+class AutofixScriptTest(unittest.TestCase):
+    def test_font_size_scale_factor(self):
+        code, rules = fix(
+            """
+            from manim import *
+            title = Text("Title", font_size=0.8)
+            body = Text("Body", font_size=24)
+            """
+        )
+        self.assertEqual(rules, ["font-size-scale"])
+        self.assertIn("font_size=DEFAULT_FONT_SIZE * 0.8", code)
+        self.assertIn("font_size=24", code)
+
+    def test_deprecated_names(self):
+        code, rules = fix(
+            """
+            from manim import *
+            self.play(ShowCreation(circle))
+            """
+        )
+        self.assertEqual(rules, ["deprecated-api"])
+        self.assertIn("Create(circle)", code)
+
+    def test_get_graph_only_on_axes(self):
+        code, rules = fix(
+            """
+            from manim import *
+            axes = Axes()
+            graph = axes.get_graph(lambda x: x**2)
+            """
+        )
+        self.assertEqual(rules, ["deprecated-api"])
+        self.assertIn("axes.plot(lambda x: x**2)", code)
+
+        # A method the script defines itself is not manim's
+        code = """
+            from manim import *
+            class Plotter:
+                def get_graph(self):
+                    return None
+            graph = Plotter().get_graph()
+            """
+        self.assertEqual(fix(code), (textwrap.dedent(code), []))
+
+    def test_raw_latex_string(self):
+        code, rules = fix(
+            """
+            from manim import *
+            formula = MathTex("\\frac{a}{b}")
+            """
+        )
+        self.assertEqual(rules, ["raw-latex-string"])
+        self.assertIn('MathTex(r"\\frac{a}{b}")', code)
+
+    def test_missing_import(self):
+        code, rules = fix(
+            """
+            class SolutionAnimation(Scene):
+                pass
+            """
+        )
+        self.assertEqual(rules, ["missing-import"])
+        self.assertIn("from manim import *", code)
+
+    def test_invalid_script_is_left_as_is(self):
+        code = "class SolutionAnimation(Scene:"
+        self.assertEqual(autofix_script(code), (code, []))
+
+
+class TexFallbackTest(unittest.TestCase):
+    def test_single_string_typeset_as_text(self):
+        code = 'label = MathTex(r"\\badcommand", color=RED, tex_to_color_map={})\n'
+        fixed_code, fixes = tex_fallback(code, "\\badcommand")
+
+        self.assertEqual([applied.rule for applied in fixes], ["tex-fallback"])
+        self.assertEqual(fixed_code, 'label = Text(r"\\badcommand", color=RED)\n')
+
+    def test_split_formula_is_left_to_the_agent(self):
+        code = 'formula = MathTex("x", "\\\\badcommand")\n'
+        self.assertEqual(tex_fallback(code, "\\badcommand"), (code, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+
+from manim_errors import (
+    CONCAT_FAILURE_PREFIX,
+    ErrorCategory,
+    Recovery,
+    classify_failure,
+)
+
+SCRIPT_PATH = "/app/manim/scripts/0123456789abcdef.py"
+
+PYTHON_LOG = """\
+Traceback (most recent call last):
+  File "/app/manim_pool.py", line 71, in render_scene
+    scene_class().render()
+  File "/app/manim/scripts/0123456789abcdef.py", line 12, in construct
+    self.play(Write(titel))
+NameError: name 'titel' is not defined
+"""
+
+# manim's rich traceback, as printed by the CLI
+RICH_LOG = """\
+╭──────────── Traceback (most recent call last) ────────────╮
+│ /app/manim/scripts/0123456789abcdef.py:27 in construct     │
+│                                                            │
+│ ❱  27 │   │   axes.get_graph(lambda x: x)                  │
+╰────────────────────────────────────────────────────────────╯
+AttributeError: Axes object has no attribute 'get_graph'
+"""
+
+
+class ClassifyFailureTest(unittest.TestCase):
+    def test_python_traceback(self):
+        error = classify_failure(PYTHON_LOG, SCRIPT_PATH)
+        self.assertEqual(error.category, ErrorCategory.PYTHON)
+        self.assertEqual(error.line, 12)
+        self.assertEqual(error.message, "NameError: name 'titel' is not defined")
+        self.assertEqual(error.recovery, Recovery.LLM_REPAIR)
+
+    def test_rich_traceback(self):
+        error = classify_failure(RICH_LOG, SCRIPT_PATH)
+        self.assertEqual(error.category, ErrorCategory.PYTHON)
+        self.assertEqual(error.line, 27)
+
+    def test_latex_error(self):
+        script = 'title = Text("Roots")\nformula = MathTex(r"\\frac{1}{2")\n'
+        with tempfile.TemporaryDirectory() as directory:
+            script_path = os.path.join(directory, "script.py")
+            log_path = os.path.join(directory, "formula.log")
+            with open(script_path, "w", encoding="utf-8") as file:
+                file.write(script)
+            tex_path = os.path.join(directory, "formula.tex")
+            with open(tex_path, "w", encoding="utf-8") as file:
+                file.write(
+                    "\\begin{document}\n\\begin{align*}\n\\frac{1}{2\n"
+                    "\\end{align*}\n\\end{document}\n"
+                )
+            with open(log_path, "w", encoding="utf-8") as file:
+                file.write("This is pdfTeX\n! Missing } inserted.\n<inserted text>\n")
+
+            log = (
+                "Traceback (most recent call last):\n"
+                f'  File "{script_path}", line 2, in construct\n'
+                "ValueError: latex error converting to dvi. See log output above "
+                f"or the log file: {log_path}\n"
+            )
+            error = classify_failure(log, script_path)
+
+        self.assertEqual(error.category, ErrorCategory.LATEX)
+        self.assertEqual(error.message, "Missing } inserted.")
+        self.assertEqual(error.tex_string, "\\frac{1}{2")
+        self.assertEqual(error.recovery, Recovery.TEX_FALLBACK)
+
+    def test_concat_failure(self):
+        log = f"{CONCAT_FAILURE_PREFIX} [concat] Impossible to open 'part.mp4'\n"
+        error = classify_failure(log, SCRIPT_PATH)
+        self.assertEqual(error.category, ErrorCategory.FFMPEG)
+        self.assertEqual(error.recovery, Recovery.RETRY_RENDER)
+
+    def test_encoder_exception(self):
+        log = "Traceback (most recent call last):\nav.error.ValueError: bad frame\n"
+        error = classify_failure(log, SCRIPT_PATH)
+        self.assertEqual(error.category, ErrorCategory.FFMPEG)
+
+    def test_killed_by_sigkill(self):
+        error = classify_failure("Render killed by signal 9", SCRIPT_PATH)
+        self.assertEqual(error.category, ErrorCategory.RESOURCE_LIMIT)
+        self.assertEqual(error.recovery, Recovery.LLM_REPAIR)
+
+    def test_killed_by_other_signal(self):
+        error = classify_failure("Render killed by signal 11", SCRIPT_PATH)
+        self.assertEqual(error.category, ErrorCategory.WORKER_CRASH)
+        self.assertEqual(error.recovery, Recovery.RETRY_RENDER)
+
+    def test_worker_crash(self):
+        log = "Render worker crashed: the render pool was restarted"
+        error = classify_failure(log, SCRIPT_PATH)
+        self.assertEqual(error.category, ErrorCategory.WORKER_CRASH)
+
+    def test_timeout_and_limits(self):
+        error = classify_failure("TimeoutError: Render timed out after 300s", "")
+        self.assertEqual(error.category, ErrorCategory.TIMEOUT)
+
+        log = "Render exceeded its CPU time limit of 600s"
+        error = classify_failure(log, SCRIPT_PATH)
+        self.assertEqual(error.category, ErrorCategory.RESOURCE_LIMIT)
+
+        log = "Traceback (most recent call last):\nMemoryError\n"
+        error = classify_failure(log, SCRIPT_PATH)
+        self.assertEqual(error.category, ErrorCategory.RESOURCE_LIMIT)
+
+    def test_unknown(self):
+        error = classify_failure("something went wrong", SCRIPT_PATH)
+        self.assertEqual(error.category, ErrorCategory.UNKNOWN)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import unittest
+
+from manim_gen import RenderJob
+from manim_sections import plan_sections
+
+SCRIPT_PATH = "./manim/scripts/wpwguovotl.py"
+
+
+def manim_video_path(media_dir: str, script_path: str, scene_name: str) -> str:
+    """Where manim writes a low quality render, "{media_dir}/videos/{module}/480p10"."""
+    module_name = os.path.splitext(os.path.basename(script_path))[0]
+    return os.path.abspath(
+        os.path.join(media_dir, "videos", module_name, "480p10", f"{scene_name}.mp4")
+    )
+
+
+class RenderJobPathTest(unittest.TestCase):
+    def setUp(self):
+        self.render_job = RenderJob(render_id="0" * 32)
+
+    def test_video_path_follows_the_script_name(self):
+        self.assertEqual(
+            self.render_job.video_path,
+            manim_video_path(
+                self.render_job.media_dir,
+                self.render_job.script_path,
+                "SolutionAnimation",
+            ),
+        )
+
+    def test_part_video_paths_follow_the_sections_script_name(self):
+        with open(SCRIPT_PATH, "r", encoding="utf-8") as file:
+            plan = plan_sections(file.read())
+        self.assertIsNotNone(plan)
+
+        for index, scene_name in enumerate(plan.scene_names):
+            self.assertEqual(
+                self.render_job.part_video_path(index, scene_name),
+                manim_video_path(
+                    self.render_job.part_media_dir(index),
+                    self.render_job.sections_script_path,
+                    scene_name,
+                ),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+import ast
+import glob
+import os
+import textwrap
+import unittest
+
+from manim_sections import plan_sections
+
+SCRIPT_DIR = "./manim/scripts/"
+
+# Scripts of the repo whose scene can be split, with their number of parts
+SPLIT_SCRIPTS = {
+    "aaanzxuahv.py": 4,
+    "ciosthsqnv.py": 5,
+    "eoyhglqrkm.py": 6,
+    "knhwsgorpt.py": 4,
+    "pgftqehivh.py": 5,
+    "pllqchjfhi.py": 3,
+    "wnqqnbivxe.py": 2,
+    "wpwguovotl.py": 8,
+}
+
+
+def scene(construct: str, *sections: str) -> str:
+    """A `SolutionAnimation` script made of the given method bodies."""
+    methods = [f"def construct(self):\n{textwrap.indent(construct, '    ')}"]
+    methods += [textwrap.dedent(section) for section in sections]
+    body = "\n\n".join(textwrap.indent(method, "    ") for method in methods)
+    return f"from manim import *\n\n\nclass SolutionAnimation(Scene):\n{body}\n"
+
+
+def construct_calls(code: str, class_name: str) -> list[str]:
+    """The statements of a class' `construct()`, unparsed."""
+    module = ast.parse(code)
+    scene_class = next(
+        node
+        for node in module.body
+        if isinstance(node, ast.ClassDef) and node.name == class_name
+    )
+    construct = next(
+        node
+        for node in scene_class.body
+        if isinstance(node, ast.FunctionDef) and node.name == "construct"
+    )
+    return [ast.unparse(statement) for statement in construct.body]
+
+
+class RepoScriptsTest(unittest.TestCase):
+    def test_repo_scripts(self):
+        script_paths = sorted(glob.glob(os.path.join(SCRIPT_DIR, "*.py")))
+        self.assertTrue(script_paths)
+
+        for script_path in script_paths:
+            name = os.path.basename(script_path)
+            with self.subTest(script=name):
+                with open(script_path, "r", encoding="utf-8") as file:
+                    code = file.read()
+                plan = plan_sections(code)
+
+                if name not in SPLIT_SCRIPTS:
+                    self.assertIsNone(plan)
+                    continue
+
+                self.assertIsNotNone(plan)
+                self.assertEqual(len(plan.scene_names), SPLIT_SCRIPTS[name])
+                self.assertTrue(plan.code.startswith(code.rstrip()))
+
+                # The parts play the sections of the scene once, in order
+                played = [
+                    call
+                    for scene_name in plan.scene_names
+                    for call in construct_calls(plan.code, scene_name)
+                ]
+                self.assertEqual(played, construct_calls(code, "SolutionAnimation"))
+
+
+class PlanSectionsTest(unittest.TestCase):
+    def test_splits_after_sections_clearing_the_screen(self):
+        code = scene(
+            "self.intro()\nself.outro()",
+            """
+            def intro(self):
+                title = Text("Title")
+                self.play(Write(title))
+                self.play(FadeOut(title))
+            """,
+            """
+            def outro(self):
+                self.add(Circle())
+                self.clear()
+            """,
+        )
+        plan = plan_sections(code)
+
+        self.assertIsNotNone(plan)
+        self.assertEqual(
+            plan.scene_names, ["SolutionAnimationPart1", "SolutionAnimationPart2"]
+        )
+        self.assertEqual(
+            construct_calls(plan.code, "SolutionAnimationPart2"), ["self.outro()"]
+        )
+
+    def test_keeps_sections_leaving_mobjects_on_screen_together(self):
+        code = scene(
+            "self.intro()\nself.outro()",
+            """
+            def intro(self):
+                title = Text("Title")
+                self.play(Write(title))
+            """,
+            """
+            def outro(self):
+                self.play(FadeOut(*self.mobjects))
+            """,
+        )
+        self.assertIsNone(plan_sections(code))
+
+    def test_replacing_transform_leaves_the_target_on_screen(self):
+        section = """
+            def intro(self):
+                a = Text("a")
+                b = Text("b")
+                self.play(Write(a))
+                self.play({transform}(a, b))
+                self.play(FadeOut({faded}))
+            """
+        outro = """
+            def outro(self):
+                self.wait()
+            """
+        construct = "self.intro()\nself.outro()"
+
+        # Transform morphs `a` into the target, fading `a` out clears the screen
+        transform = section.format(transform="Transform", faded="a")
+        self.assertIsNotNone(plan_sections(scene(construct, transform, outro)))
+
+        # ReplacementTransform puts `b` on the screen instead of `a`
+        replacement = section.format(transform="ReplacementTransform", faded="a")
+        self.assertIsNone(plan_sections(scene(construct, replacement, outro)))
+
+        replacement = section.format(transform="ReplacementTransform", faded="b")
+        self.assertIsNotNone(plan_sections(scene(construct, replacement, outro)))
+
+    def test_animating_an_inline_group_is_not_tracked(self):
+        section = """
+            def intro(self):
+                circle = Circle()
+                self.add(circle)
+                {animation}
+                self.play(FadeOut(circle))
+            """
+        outro = """
+            def outro(self):
+                self.wait()
+            """
+        construct = "self.intro()\nself.outro()"
+
+        tracked = section.format(animation="self.play(circle.animate.shift(UP))")
+        self.assertIsNotNone(plan_sections(scene(construct, tracked, outro)))
+
+        # Animating a mobject adds it to the scene, this one is never faded out
+        untracked = section.format(
+            animation="self.play(VGroup(Circle(), Square()).animate.shift(UP))"
+        )
+        self.assertIsNone(plan_sections(scene(construct, untracked, outro)))
+
+    def test_sections_sharing_state_are_not_split(self):
+        code = scene(
+            "self.intro()\nself.outro()",
+            """
+            def intro(self):
+                self.title = Text("Title")
+                self.clear()
+            """,
+            """
+            def outro(self):
+                self.play(Write(self.title))
+            """,
+        )
+        self.assertIsNone(plan_sections(code))
+
+    def test_invalid_scripts_are_not_split(self):
+        self.assertIsNone(plan_sections("class SolutionAnimation(Scene:"))
+        self.assertIsNone(plan_sections("class Other(Scene):\n    pass\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
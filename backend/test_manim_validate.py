@@ -0,0 +1,129 @@
+import glob
+import os
+import textwrap
+import unittest
+
+from manim_validate import _star_import_names, validate_script
+
+SCRIPT_DIR = "./manim/scripts/"
+
+
+def issue_codes(code: str) -> list[str]:
+    return [issue.code for issue in validate_script(textwrap.dedent(code))]
+
+
+class RepoScriptsTest(unittest.TestCase):
+    def test_repo_scripts_are_not_rejected(self):
+        script_paths = sorted(glob.glob(os.path.join(SCRIPT_DIR, "*.py")))
+        self.assertTrue(script_paths)
+
+        for script_path in script_paths:
+            with self.subTest(script=os.path.basename(script_path)):
+                with open(script_path, "r", encoding="utf-8") as file:
+                    issues = validate_script(file.read())
+                # Undefined names depend on the installed manim version (some
+                # scripts use names older versions exported, e.g. FRAME_WIDTH)
+                self.assertEqual(
+                    [issue for issue in issues if issue.code != "undefined-name"],
+                    [],
+                )
+
+
+class ValidateScriptTest(unittest.TestCase):
+    def test_names_bound_anywhere_are_defined(self):
+        issues = validate_script(
+            textwrap.dedent(
+                """
+                from math import *
+                import numpy as np
+
+                COUNT = 3
+
+                class SolutionAnimation(Scene):
+                    def construct(self):
+                        global COUNT
+                        values = [sqrt(value) for value in range(COUNT)]
+                        square = lambda x: x * x
+                        try:
+                            total = np.sum(values)
+                        except ValueError as error:
+                            print(error)
+                        return square(total)
+                """
+            )
+        )
+        # Only `Scene` is unknown, math does not define it
+        self.assertEqual(
+            [issue.message for issue in issues], ["Name 'Scene' is not defined"]
+        )
+
+    def test_undefined_name(self):
+        issues = validate_script(
+            textwrap.dedent(
+                """
+                from math import *
+
+                class SolutionAnimation(Scene):
+                    def construct(self):
+                        self.play(Write(titel))
+                """
+            )
+        )
+        undefined = {issue.message for issue in issues}
+        self.assertIn("Name 'titel' is not defined", undefined)
+        self.assertIn("Name 'Write' is not defined", undefined)
+
+    def test_unresolved_star_import_skips_the_name_check(self):
+        codes = issue_codes(
+            """
+            from some_library import *
+
+            class SolutionAnimation(Scene):
+                def construct(self):
+                    self.play(Anything())
+            """
+        )
+        self.assertEqual(codes, [])
+
+    def test_scene_shape(self):
+        self.assertEqual(issue_codes("x = 1"), ["missing-scene"])
+        self.assertEqual(
+            issue_codes(
+                """
+                class SolutionAnimation(object):
+                    pass
+                """
+            ),
+            ["invalid-scene", "missing-construct"],
+        )
+        self.assertEqual(issue_codes("class SolutionAnimation(:"), ["syntax-error"])
+
+    def test_forbidden_imports_and_calls(self):
+        codes = issue_codes(
+            """
+            import os
+            from subprocess import run
+            from manim import *
+
+            class SolutionAnimation(Scene):
+                def construct(self):
+                    eval("1")
+            """
+        )
+        self.assertEqual(sorted(set(codes)), ["forbidden-call", "forbidden-import"])
+        self.assertEqual(codes.count("forbidden-import"), 2)
+
+
+class StarImportNamesTest(unittest.TestCase):
+    def test_manim_is_never_an_empty_namespace(self):
+        # ./manim/ (the renders' directory) imports as a namespace package
+        # when the library is missing, its names must not be trusted
+        names = _star_import_names("manim")
+        self.assertTrue(names is None or "Scene" in names)
+
+    def test_unlisted_modules_are_not_imported(self):
+        self.assertIsNone(_star_import_names("os"))
+
+
+if __name__ == "__main__":
+    unittest.main()
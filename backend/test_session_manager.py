@@ -0,0 +1,69 @@
+import time
+import unittest
+
+from session_manager import SessionManager
+
+APP_NAME = "test-app"
+USER_ID = "test-user"
+
+
+class SessionManagerTest(unittest.IsolatedAsyncioTestCase):
+    async def stored(self, manager: SessionManager, session_id: str) -> bool:
+        session = await manager.service.get_session(
+            app_name=APP_NAME, user_id=USER_ID, session_id=session_id
+        )
+        return session is not None and manager.exists(APP_NAME, USER_ID, session_id)
+
+    async def test_ephemeral_session_is_deleted_after_the_request(self):
+        manager = SessionManager()
+        async with manager.session(APP_NAME, USER_ID) as session_id:
+            self.assertTrue(await self.stored(manager, session_id))
+
+        self.assertFalse(await self.stored(manager, session_id))
+        self.assertEqual(len(manager), 0)
+
+    async def test_named_session_is_reused(self):
+        manager = SessionManager()
+        async with manager.session(APP_NAME, USER_ID, "conversation") as session_id:
+            self.assertEqual(session_id, "conversation")
+        async with manager.session(APP_NAME, USER_ID, "conversation"):
+            pass
+
+        self.assertTrue(await self.stored(manager, "conversation"))
+        self.assertEqual(len(manager), 1)
+
+    async def test_least_recently_used_idle_session_is_evicted(self):
+        manager = SessionManager(max_sessions=2)
+        for session_id in ("first", "second"):
+            async with manager.session(APP_NAME, USER_ID, session_id):
+                pass
+        # Using "first" again makes "second" the least recently used
+        async with manager.session(APP_NAME, USER_ID, "first"):
+            pass
+
+        async with manager.session(APP_NAME, USER_ID, "third"):
+            pass
+
+        self.assertTrue(await self.stored(manager, "first"))
+        self.assertFalse(await self.stored(manager, "second"))
+        self.assertTrue(await self.stored(manager, "third"))
+
+    async def test_active_sessions_are_never_evicted(self):
+        manager = SessionManager(max_sessions=1, ttl=0)
+        async with manager.session(APP_NAME, USER_ID, "running"):
+            async with manager.session(APP_NAME, USER_ID, "other"):
+                self.assertTrue(await self.stored(manager, "running"))
+
+    async def test_idle_sessions_expire(self):
+        manager = SessionManager(ttl=60)
+        async with manager.session(APP_NAME, USER_ID, "old"):
+            pass
+        manager._entries[(APP_NAME, USER_ID, "old")].last_used = time.monotonic() - 61
+
+        await manager.prune()
+
+        self.assertFalse(await self.stored(manager, "old"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import hashlib
+import os
+import re
+
+from manim_utils import atomic_write, prune_directory_lru, touch
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads/")
+
+# Largest image accepted, matches the limit of the extension
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(10 * 1024**2)))
+
+# Upper bound for the images kept, least recently used ones are evicted
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(1024**3)))
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+
+def upload_id_of(data: bytes) -> str:
+    """The id of an upload, the sha256 hex digest of its content."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _upload_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_DIR, upload_id)
+
+
+def save(data: bytes) -> str:
+    """
+    Stores an uploaded image under the hash of its content. Uploading the same
+    image again returns the same id without writing it twice.
+
+    Args:
+        data: bytes - The content of the image.
+
+    Returns:
+        str - The id to reference the image by.
+    """
+    upload_id = upload_id_of(data)
+    path = _upload_path(upload_id)
+
+    # Already stored, only mark it as recently used
+    if touch(path):
+        return upload_id
+
+    with atomic_write(path) as temp_path:
+        with open(temp_path, "wb") as file:
+            file.write(data)
+
+    evicted = prune_directory_lru(UPLOAD_DIR, UPLOAD_MAX_BYTES)
+    if evicted:
+        print(f"Evicted {evicted} images from the upload store")
+
+    return upload_id
+
+
+def load(upload_id: str) -> bytes | None:
+    """
+    Returns the content of an upload, or None if the id is malformed or the
+    image is not (or no longer) stored.
+    """
+    # Ids are sha256 hex digests, anything else could escape the upload directory
+    if not re.fullmatch(r"[0-9a-f]{64}", upload_id):
+        return None
+
+    path = _upload_path(upload_id)
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        return None
+    touch(path)
+
+    return data
@@ -19,7 +19,10 @@ const removeImageBtn = document.getElementById("removeImageBtn")
 
 // State Management
 let selectedImageFile = null
+let chatConversationId = null // Server-side conversation, set after the first chat turn
+let uploadedImageId = null // Server-side copy of the submitted image, shared by every endpoint
 const API_URL = "http://127.0.0.1:8000"
+const MANIM_POLL_INTERVAL_MS = 3000
 
 // Initialize Event Listeners
 document.addEventListener("DOMContentLoaded", () => {
@@ -273,25 +276,10 @@ async function handleChatSend() {
     try {
         console.log("Sending chat message to API:", message)
         
-        // Build chat history from existing messages
-        const chatHistory = buildChatHistoryFromDOM()
-        console.log("Chat history being sent:", chatHistory)
-        console.log("API URL:", `${API_URL}/chat`)
-        
-        // Add the current message to history
-        chatHistory.push({
-            role: "user",
-            content: message
-        })
-        
-        // Make API call to /chat endpoint
-        const response = await fetch(`${API_URL}/chat`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-                chat_history: chatHistory
-            })
-        })
+        console.log("API URL:", `${API_URL}/chat/stream`)
+
+        // Make API call to /chat/stream endpoint
+        const response = await sendChatMessage(message)
 
         if (!response.ok) {
             const errorText = await response.text()
@@ -300,20 +288,28 @@ async function handleChatSend() {
             throw new Error(`API error: ${response.status} ${response.statusText} - ${errorText}`)
         }
 
-        const result = await response.json()
+        // Show the answer as it streams in, rendered as markdown once complete
+        const messageDiv = addChatMessage("assistant", "")
+        let streamedText = ""
+        const result = await readChatStream(response, (text) => {
+            streamedText += text
+            messageDiv.textContent = streamedText
+            messageDiv.parentElement.scrollTop = messageDiv.parentElement.scrollHeight
+        })
         console.log("Chat API Response:", result)
-        console.log("Response keys:", Object.keys(result))
-        console.log("Response structure:", JSON.stringify(result, null, 2))
+
+        // Later turns only send the new message within this conversation
+        chatConversationId = result.conversation_id || null
         
         // Extract and clean the response - backend uses "response" key
-        const summaryText = result.response || result.text || "No response provided."
+        const summaryText = result.response || streamedText || "No response provided."
         console.log("Extracted summary text:", summaryText)
         
         const linksHtml = result.html_links
         const cleanSummary = summaryText.replace("##ADK_RESPONSE_END##", "").trim()
         
-        // Add assistant response to chat
-        addChatMessage("assistant", cleanSummary)
+        // Replace the streamed text with the final response
+        setChatMessageContent(messageDiv, "assistant", cleanSummary)
         
         // Add HTML links if available
         if (linksHtml) {
@@ -331,6 +327,85 @@ async function handleChatSend() {
     }
 }
 
+// Sends a chat turn, only the new message once the server holds the conversation
+async function sendChatMessage(message) {
+    if (chatConversationId) {
+        const response = await postChat({
+            conversation_id: chatConversationId,
+            message: message
+        })
+        if (response.status !== 404) {
+            return response
+        }
+
+        // The conversation expired on the server, start over with the full transcript
+        console.log("Chat conversation expired, resending full history")
+        chatConversationId = null
+    }
+
+    // The transcript already ends with the new user message
+    const chatHistory = buildChatHistoryFromDOM()
+    console.log("Chat history being sent:", chatHistory)
+    const body = { chat_history: chatHistory }
+    if (uploadedImageId) {
+        // Let the tutor see the submitted image when the conversation starts
+        body.upload_id = uploadedImageId
+    }
+    return postChat(body)
+}
+
+function postChat(body) {
+    return fetch(`${API_URL}/chat/stream`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body)
+    })
+}
+
+// Reads the Server-Sent Events of /chat/stream, passing text chunks to onText
+// and returning the merged payloads of the start and done events
+async function readChatStream(response, onText) {
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ""
+    let result = {}
+
+    while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+
+        buffer += decoder.decode(value, { stream: true })
+        const rawEvents = buffer.split("\n\n")
+        buffer = rawEvents.pop()
+
+        for (const rawEvent of rawEvents) {
+            const { event, data } = parseServerSentEvent(rawEvent)
+            if (event === "delta") {
+                onText(data.text)
+            } else if (event === "start" || event === "done") {
+                result = { ...result, ...data }
+            }
+        }
+    }
+
+    return result
+}
+
+function parseServerSentEvent(rawEvent) {
+    let event = "message"
+    const dataLines = []
+
+    rawEvent.split("\n").forEach(line => {
+        if (line.startsWith("event:")) {
+            event = line.slice("event:".length).trim()
+        } else if (line.startsWith("data:")) {
+            dataLines.push(line.slice("data:".length).trim())
+        }
+    })
+
+    return { event, data: dataLines.length ? JSON.parse(dataLines.join("\n")) : {} }
+}
+
 function autoResizeChatInput() {
     const chatInput = document.getElementById("chatInput")
     chatInput.style.height = "auto"
@@ -390,11 +465,18 @@ async function handleSubmit() {
         linksFormData.append('context', textValue || '')
         manimFormData.append('context', textValue || '')
 
-        // Add image if selected
+        // Add image if selected, uploaded once and referenced by id
+        uploadedImageId = null
         if (selectedImageFile) {
-            linksFormData.append('image', selectedImageFile, selectedImageFile.name)
-            manimFormData.append('image', selectedImageFile, selectedImageFile.name)
             console.log("Using selected image:", selectedImageFile.name)
+            uploadedImageId = await uploadImage(selectedImageFile)
+            if (uploadedImageId) {
+                linksFormData.append('upload_id', uploadedImageId)
+                manimFormData.append('upload_id', uploadedImageId)
+            } else {
+                linksFormData.append('image', selectedImageFile, selectedImageFile.name)
+                manimFormData.append('image', selectedImageFile, selectedImageFile.name)
+            }
         }
 
         // Start both API calls in parallel
@@ -405,7 +487,7 @@ async function handleSubmit() {
             body: linksFormData
         })
         
-        const manimPromise = fetch(`${API_URL}/manim`, {
+        const manimPromise = fetch(`${API_URL}/manim/jobs`, {
             method: "POST",
             body: manimFormData
         })
@@ -431,6 +513,29 @@ async function handleSubmit() {
     }
 }
 
+// Uploads an image once, returns its id or null if the upload failed
+async function uploadImage(file) {
+    try {
+        const formData = new FormData()
+        formData.append('image', file, file.name)
+        const response = await fetch(`${API_URL}/uploads`, {
+            method: "POST",
+            body: formData
+        })
+        if (!response.ok) {
+            throw new Error(`Upload API error: ${response.statusText}`)
+        }
+
+        const result = await response.json()
+        console.log("Uploaded image:", result.upload_id)
+        return result.upload_id
+    } catch (error) {
+        // The endpoints still accept the image itself
+        console.error("Error uploading image, sending it inline:", error)
+        return null
+    }
+}
+
 // Handle the links API response separately
 async function handleLinksResponse(linksPromise) {
     try {
@@ -478,16 +583,16 @@ async function handleManimResponse(manimPromise) {
             throw new Error(`Manim API error: ${manimResponse.statusText}`)
         }
 
-        const manimResult = await manimResponse.json()
+        const manimJob = await manimResponse.json()
+        console.log("Manim job submitted:", manimJob.job_id)
+
+        const manimResult = await waitForManimJob(manimJob.job_id)
         console.log("Manim API Response received:", manimResult.status)
         
-        if (manimResult.video_data && manimResult.status === "success") {
-            // Store the video data for download functionality
-            window.generatedVideoData = manimResult.video_data
-            
-            // Convert base64 video data to blob URL
-            const videoBlob = base64ToBlob(manimResult.video_data, 'video/mp4')
-            const videoUrl = URL.createObjectURL(videoBlob)
+        if (manimResult.video_url && manimResult.status === "success") {
+            // Stream the video straight from the backend so it plays progressively
+            const videoUrl = `${API_URL}${manimResult.video_url}`
+            window.generatedVideoUrl = videoUrl
             
             // Update video player with generated video
             updateVideoPlayer(videoUrl)
@@ -507,19 +612,36 @@ async function handleManimResponse(manimPromise) {
     }
 }
 
-// Helper function to convert base64 to blob
-function base64ToBlob(base64Data, contentType) {
-    // Remove data URL prefix if present
-    const base64String = base64Data.includes(',') ? base64Data.split(',')[1] : base64Data
-    const byteCharacters = atob(base64String)
-    const byteNumbers = new Array(byteCharacters.length)
-    
-    for (let i = 0; i < byteCharacters.length; i++) {
-        byteNumbers[i] = byteCharacters.charCodeAt(i)
+// Poll a manim job until it finishes, then fetch its result
+async function waitForManimJob(jobId) {
+    const jobUrl = `${API_URL}/manim/jobs/${jobId}`
+
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, MANIM_POLL_INTERVAL_MS))
+
+        const statusResponse = await fetch(jobUrl)
+        if (!statusResponse.ok) {
+            throw new Error(`Manim job status error: ${statusResponse.statusText}`)
+        }
+
+        const job = await statusResponse.json()
+        console.log("Manim job stage:", job.stage)
+
+        if (job.status === "failed") {
+            throw new Error(`Manim job failed: ${job.error}`)
+        }
+
+        if (job.status === "succeeded") {
+            break
+        }
     }
-    
-    const byteArray = new Uint8Array(byteNumbers)
-    return new Blob([byteArray], { type: contentType })
+
+    const resultResponse = await fetch(`${jobUrl}/result`)
+    if (!resultResponse.ok) {
+        throw new Error(`Manim job result error: ${resultResponse.statusText}`)
+    }
+
+    return resultResponse.json()
 }
 
 // UI State Management Functions
@@ -634,6 +756,17 @@ function addChatMessage(sender, message) {
     const messageDiv = document.createElement("div")
     messageDiv.className = `chat-message ${sender}`
     
+    setChatMessageContent(messageDiv, sender, message)
+    
+    chatMessages.appendChild(messageDiv)
+    
+    // Scroll to bottom
+    chatMessages.scrollTop = chatMessages.scrollHeight
+
+    return messageDiv
+}
+
+function setChatMessageContent(messageDiv, sender, message) {
     // Check if the message contains markdown-like content
     if (sender === 'assistant' && containsMarkdown(message)) {
         try {
@@ -652,11 +785,6 @@ function addChatMessage(sender, message) {
         // Plain text for user messages or simple assistant messages
         messageDiv.textContent = message
     }
-    
-    chatMessages.appendChild(messageDiv)
-    
-    // Scroll to bottom
-    chatMessages.scrollTop = chatMessages.scrollHeight
 }
 
 // Helper function to detect if content likely contains markdown
@@ -694,6 +822,7 @@ function addHtmlMessage(sender, htmlContent) {
 function clearChatMessages() {
     const chatMessages = document.getElementById("chatMessages")
     chatMessages.innerHTML = ""
+    chatConversationId = null
 }
 
 // Video Control Functions
@@ -735,12 +864,13 @@ function setupVideoEventListeners(mathVideo, downloadBtn, newQuestionBtn, isGene
   newQuestionBtn.parentNode.replaceChild(newNewQuestionBtn, newQuestionBtn)
 
   // Download functionality
-  newDownloadBtn.addEventListener("click", () => {
+  newDownloadBtn.addEventListener("click", async () => {
     const a = document.createElement('a')
     
-    if (isGeneratedVideo && window.generatedVideoData) {
-      // Download the generated video using the stored base64 data
-      const videoBlob = base64ToBlob(window.generatedVideoData, 'video/mp4')
+    if (isGeneratedVideo && window.generatedVideoUrl) {
+      // Download the generated video from the backend
+      const videoResponse = await fetch(window.generatedVideoUrl)
+      const videoBlob = await videoResponse.blob()
       const videoUrl = URL.createObjectURL(videoBlob)
       a.href = videoUrl
       a.download = 'generated-math-solution.mp4'
@@ -789,7 +919,7 @@ function resetToPlaceholder() {
   }
 
   // Clean up stored video data
-  window.generatedVideoData = null
+  window.generatedVideoUrl = null
 
   // Hide video container, show placeholder
   videoContainer.style.display = "none"
@@ -808,7 +938,7 @@ function resetToPlaceholder() {
 function clearInputs() {
   textInput.value = ""
   selectedImageFile = null
-  window.generatedVideoData = null
+  window.generatedVideoUrl = null
   
   // Reset image UI
   imagePreview.style.display = "none"